@@ -0,0 +1,136 @@
+"""
+Generates a synthetic Kattis JSON export and a matching Canvas gradebook export for benchmarking.
+
+    python3 -m benchmarks.generate --students 500 --sessions 100 --output-folder bench_data
+"""
+import argparse
+import csv
+import json
+import os
+import random
+from typing import Dict, List, Tuple
+
+FIRST_NAMES = ['james', 'mary', 'robert', 'patricia', 'john', 'jennifer', 'michael', 'linda', 'david', 'elizabeth',
+               'william', 'barbara', 'richard', 'susan', 'joseph', 'jessica', 'thomas', 'sarah', 'wei', 'priya']
+LAST_NAMES = ['smith', 'johnson', 'williams', 'brown', 'jones', 'garcia', 'miller', 'davis', 'rodriguez', 'martinez',
+              'hernandez', 'lopez', 'nguyen', 'wilson', 'anderson', 'thomas', 'taylor', 'moore', 'patel', 'chen']
+PROBLEMS_PER_SESSION = 5
+UNRELATED_COLUMNS = ['Attendance (101)', 'Exam 1 (102)', 'Exam 2 (103)', 'Final Exam (104)', 'Current Score',
+                     'Final Score']
+
+
+def _student_names(count: int, rng: random.Random) -> List[Tuple[str, str]]:
+    # a numeric suffix keeps every name unique however large the roster gets
+    return [
+        (f"{rng.choice(FIRST_NAMES).title()}{i}", f"{rng.choice(LAST_NAMES).title()}{i}") for i in range(count)
+    ]
+
+
+def _session_specs(count: int) -> List[Tuple[str, str, int, bool]]:
+    """:return: (kattis session name, canvas column name, assignment number, is upsolve) for every session"""
+    specs = []
+    number = 0
+    while len(specs) < count:
+        # canvas only has two digits for the assignment number; past 99 the extra sessions become redos
+        redo = number // 99
+        num = number % 99 + 1
+        for kind, label in (('PS', 'Problem Set'), ('Lab', 'Lab')):
+            for is_upsolve in (False, True):
+                solve_type = 'Upsolve' if is_upsolve else 'Solve'
+                name = f"CSCE 120 {label} - {num:02d}" + (" Upsolve" if is_upsolve else "") + \
+                       (f" (redo {redo})" if redo > 0 else "")
+                column = f"{kind}{num:02d} {solve_type} ({1000 + 4 * num + (2 if kind == 'Lab' else 0) + is_upsolve})"
+                specs.append((name, column, num, is_upsolve))
+        number += 1
+    return specs[:count]
+
+
+def generate(students: int, sessions: int, output_folder: str, seed: int = 0, participation: float = 0.6,
+             team_rate: float = 0.1, honors_rate: float = 0.1) -> Tuple[str, str]:
+    """
+    Writes kattis.json and canvas.csv into the output folder.
+    :param students: number of students on the roster
+    :param sessions: number of kattis sessions (solve and upsolve, problem sets and labs)
+    :param seed: seed for the random generator, so runs are reproducible
+    :param participation: chance that a student has a result in a given session
+    :param team_rate: chance that a result belongs to a team of two or three students
+    :param honors_rate: fraction of students in an honors (2xx) section
+    :return: paths to the kattis json and the canvas csv
+    """
+    rng = random.Random(seed)
+    os.makedirs(output_folder, exist_ok=True)
+    names = _student_names(students, rng)
+    usernames = [f"student{i}" for i in range(students)]
+    specs = _session_specs(sessions)
+    columns = sorted({column for _, column, _, _ in specs})
+
+    # solve and upsolve sessions of the same assignment share their problems
+    assignment_problems: Dict[Tuple[str, int], List[str]] = {}
+    kattis_sessions = []
+    for name, column, num, is_upsolve in specs:
+        # e.g. ('PS01', 1) -> ps01problem0, ps01problem1, ...
+        key = (column.split(' ')[0], num)
+        problems = assignment_problems.setdefault(key, [f"{key[0].lower()}problem{j}" for j in
+                                                        range(PROBLEMS_PER_SESSION)])
+        results = []
+        i = 0
+        while i < students:
+            team_size = rng.choice((2, 3)) if rng.random() < team_rate else 1
+            members = usernames[i:i + team_size]
+            i += team_size
+            if rng.random() >= participation:
+                continue
+            result_problems = [
+                {'problem_name': problem, 'solve_time': rng.randint(1, 300)} if rng.random() < 0.5
+                else {'problem_name': problem}
+                for problem in problems
+            ]
+            results.append({
+                'team_name': '-'.join(members),
+                'solved_count': sum(1 for problem in result_problems if 'solve_time' in problem),
+                'total_time': rng.randint(1, 1000),
+                'members': members,
+                'problems': result_problems
+            })
+        kattis_sessions.append({
+            'name': name,
+            'starttime': str(1_600_000_000 + len(kattis_sessions) * 86400),
+            'length': '7200',
+            'problems': {str(j): {'problem_name': problem} for j, problem in enumerate(problems)},
+            'results': results
+        })
+
+    kattis_students = [
+        {'username': username, 'name': f"{first} {last}", 'non_anonymous': 't', 'email': f"{username}@example.edu"}
+        for username, (first, last) in zip(usernames, names)
+    ]
+    kattis_path = os.path.join(output_folder, 'kattis.json')
+    with open(kattis_path, 'w') as kattis_file:
+        json.dump({'students': kattis_students, 'sessions': kattis_sessions}, kattis_file)
+
+    canvas_path = os.path.join(output_folder, 'canvas.csv')
+    rows = list(range(students))
+    rng.shuffle(rows)
+    with open(canvas_path, 'w', newline='') as canvas_file:
+        writer = csv.writer(canvas_file)
+        writer.writerow(['Student', 'ID', 'SIS User ID', 'SIS Login ID', 'Section'] + columns + UNRELATED_COLUMNS)
+        writer.writerow(['    Points Possible', '', '', '', ''] + [PROBLEMS_PER_SESSION] * len(columns) +
+                        [100] * len(UNRELATED_COLUMNS))
+        for i in rows:
+            first, last = names[i]
+            section = f"CSCE-120-{200 + i % 3 if rng.random() < honors_rate else 500 + i % 5}"
+            writer.writerow([f"{last}, {first}", 10000 + i, f"{900000000 + i}", usernames[i], section] +
+                            [''] * len(columns) + [rng.randint(50, 100) for _ in UNRELATED_COLUMNS])
+
+    return kattis_path, canvas_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generates a synthetic Kattis export and Canvas gradebook.")
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--participation', type=float, default=0.6)
+    parser.add_argument('--output-folder', default='bench_data')
+    args = parser.parse_args()
+    print(generate(args.students, args.sessions, args.output_folder, args.seed, args.participation))
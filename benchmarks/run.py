@@ -0,0 +1,133 @@
+"""
+Times each stage of the Kattis -> Canvas pipeline on synthetic data and appends the results to a JSON lines file.
+
+    python3 -m benchmarks.run --scale 50x10 --scale 2000x300
+"""
+import argparse
+import datetime
+import json
+import logging as log
+import os
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import main
+from benchmarks.generate import generate
+from models.Problems import PROBLEMS, SOLVES
+from models.Result import USERNAMES
+from models.Student import Student
+from util import Honors, Input
+
+DEFAULT_SCALES = ['50x10', '500x100', '2000x300']
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), 'results.jsonl')
+
+
+def _version() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def _parse_scale(scale: str) -> Tuple[int, int]:
+    students, sessions = scale.lower().split('x')
+    return int(students), int(sessions)
+
+
+def run_pipeline(kattis_path: str, canvas_path: str, cache_folder: str, backend: str = 'pandas') -> Dict[str, float]:
+    """Runs the same steps as main.main() without prompting and returns the seconds spent in each stage."""
+    PROBLEMS.reset()
+    USERNAMES.reset()
+    SOLVES.reset()
+    timings: Dict[str, float] = {}
+    stage_start = time.perf_counter()
+
+    def end_stage(stage: str):
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[stage] = now - stage_start
+        stage_start = now
+
+    student_dict, sessions = Input.load_kattis_info(kattis_path)
+    end_stage('load_kattis_info')
+    Student.populate_problems_solved_from_sessions(student_dict, sessions)
+    end_stage('populate_problems_solved_from_sessions')
+
+    canvas_df = Input.load_canvas_info(canvas_path, backend=backend)
+    original_df = canvas_df.copy()
+    canvas_util = Input.CanvasUtil(canvas_df, cache_folder, interactive=False)
+    end_stage('load_canvas_info')
+    canvas_util.populate_canvas_names(student_dict)
+    end_stage('populate_canvas_names')
+    canvas_util.populate_canvas_session_names(sessions)
+    end_stage('populate_canvas_session_names')
+    honors = Honors.HonorsRules(main.HONORS_RULES, cache_folder)
+    honors.mark_students(student_dict, canvas_util.canvas_df, canvas_util.student_rows)
+    honors.clear_points()
+    Student.set_canvas_row_indices(student_dict, canvas_util.student_rows)
+    end_stage('honors')
+    canvas_util.populate_grades(student_dict, sessions)
+    end_stage('populate_grades')
+    main.sanity_check(canvas_util, original_df, student_dict)
+    end_stage('sanity_check')
+    return timings
+
+
+def run_benchmarks(scales: List[str], repeat: int, results_path: str, seed: int, backend: str = 'pandas') -> List[Dict]:
+    records = []
+    version = _version()
+    for scale in scales:
+        students, sessions = _parse_scale(scale)
+        with tempfile.TemporaryDirectory() as folder:
+            print(f"Generating {students} students x {sessions} sessions...")
+            kattis_path, canvas_path = generate(students, sessions, folder, seed)
+            cache_folder = os.path.join(folder, 'cache')
+            os.makedirs(cache_folder)
+            with open(os.path.join(cache_folder, 'honors_problems.in'), 'w') as honors_file:
+                honors_file.write('ps01problem0\nlab01problem0\n')
+
+            for run in range(repeat):
+                # every run matches names from scratch
+                store_path = os.path.join(cache_folder, 'studentmap.db')
+                if os.path.exists(store_path):
+                    os.remove(store_path)
+                timings = run_pipeline(kattis_path, canvas_path, cache_folder, backend)
+                record = {
+                    'version': version,
+                    'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'students': students,
+                    'sessions': sessions,
+                    'seed': seed,
+                    'backend': backend,
+                    'run': run,
+                    'timings': timings,
+                    'total': sum(timings.values())
+                }
+                records.append(record)
+                with open(results_path, 'a') as results_file:
+                    results_file.write(json.dumps(record) + '\n')
+    return records
+
+
+def print_records(records: List[Dict]):
+    for record in records:
+        stages = ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in record['timings'].items())
+        print(f"{record['students']}x{record['sessions']} (run {record['run']}): total {record['total']:.3f}s; "
+              f"{stages}")
+
+
+if __name__ == '__main__':
+    # same as main(), so the discrepancy warnings aren't part of the timings
+    log.basicConfig(level=main.LOGGING_LEVEL)
+    parser = argparse.ArgumentParser(description="Benchmarks the pipeline on synthetic Kattis and Canvas exports.")
+    parser.add_argument('--scale', action='append', metavar='STUDENTSxSESSIONS',
+                        help=f"problem size to run, may be repeated (default: {' '.join(DEFAULT_SCALES)})")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per scale")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', choices=Input.BACKENDS, default='pandas', help="gradebook backend to benchmark")
+    parser.add_argument('--results', default=RESULTS_PATH, help="JSON lines file the results are appended to")
+    args = parser.parse_args()
+    print_records(run_benchmarks(args.scale or DEFAULT_SCALES, args.repeat, args.results, args.seed, args.backend))
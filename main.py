@@ -1,13 +1,21 @@
+import argparse
+import functools
 import logging as log
-import re
-from typing import Dict, Set
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 
-import numpy
-import pandas as pd
-
-import util.Caching
+from models.Problems import PROBLEMS, SOLVES
+from models.Result import USERNAMES
+from models.Session import Session
 from models.Student import Student
-from util import Input
+from util import Gradebook, Honors, Incremental, Input, Snapshot, Watch
+from util.Profiling import PROFILER
+
+# Batch and Fetch load asyncio and concurrent.futures, so they are only imported for --batch and downloads
+if TYPE_CHECKING:
+    from util import Batch, Fetch
 
 log.addLevelName(log.WARNING, "\033[1;31m%s\033[1;0m" % log.getLevelName(log.WARNING))
 log.addLevelName(log.ERROR, "\033[1;41m%s\033[1;0m" % log.getLevelName(log.ERROR))
@@ -15,92 +23,542 @@ log.addLevelName(log.ERROR, "\033[1;41m%s\033[1;0m" % log.getLevelName(log.ERROR
 # Feel free to change these
 KATTIS_JSON = ''
 CANVAS_CSV_PATH = ''
+# Stream the Kattis dump instead of loading it all at once; uses much less memory on large exports
+STREAM_KATTIS_JSON = False
+# Worker processes to parse the Kattis sessions with; 1 parses them in this process
+PARSE_WORKERS = 1
+# Save the parsed Kattis dump as a memory-mapped snapshot in the cache folder, and load that instead while the dump
+# hasn't changed
+KATTIS_SNAPSHOT = False
+# Only regrade the columns whose Kattis sessions or gradebook rows changed since the last run
+INCREMENTAL = False
+# Only read the id and problem set columns of the gradebook
+SELECTIVE_CANVAS_LOAD = False
+# Only export the students and columns whose grades changed, ready to import into Canvas
+DELTA_EXPORT = False
+# Students in a section matching a pattern don't get points for the problems listed in its file in the cache folder
+HONORS_RULES = Honors.DEFAULT_HONORS_RULES
+# When running non-interactively, possible name matches at least this similar (0-1) are accepted without asking;
+# the rest are written to cache/match_review.csv to be decided on before the next run
+AUTO_ACCEPT_SCORE = Input.AUTO_ACCEPT_SCORE
 LOGGING_LEVEL = log.ERROR
 
-# Probably don't change this one
-CACHE_FOLDER = 'cache'
-
+# 'pandas' loads the gradebook into a DataFrame; 'csv' uses a lightweight backend that never imports pandas or numpy,
+# which starts much faster for small sections
+GRADEBOOK_BACKEND = 'pandas'
 
-def populate_honors(students: Dict[str, Student], canvas_df: pd.DataFrame):
-    for _, student in students.items():
-        sections = canvas_df[canvas_df['Student'] == student.canvas_name]['Section'].values
-        if len(sections) > 0:
-            honors_section_regex = '2\\d{2}'
-            student.honors = len(re.findall(honors_section_regex, sections[0])) > 0
-            if student.honors:
-                log.info(f"Set {student.name} to honors.")
+# Probably don't change these
+CACHE_FOLDER = 'cache'
+OUTPUT_PATH = 'output.csv'
+# --watch mode: seconds between checks for new exports, and the local port grades are served on
+WATCH_INTERVAL = 5.0
+WATCH_PORT = 8000
+# downloads of Kattis and Canvas exports that run at once
+FETCH_CONNECTIONS = 8
 
 
-def clear_honors_points(student_dict: Dict[str, Student]):
-    # get honors problems to skip
-    cache_util = util.Caching.CacheUtil(CACHE_FOLDER)
-    honors_problems: Set[str] = cache_util.read_honors_skips('honors_problems.in')
+def _diff_module(canvas_util: Input.CanvasUtil):
+    """The discrepancy/export helpers for the gradebook's backend; only imports pandas for the DataFrame backend."""
+    if isinstance(canvas_util.canvas_df, Gradebook.CsvGradebook):
+        return Gradebook
+    from util import Diff
+    return Diff
 
-    # for each student, if they are in honors, set those problems to 0 score if they exist.
-    for _, student in student_dict.items():
-        for problem in honors_problems:
-            if student.honors:
-                student.problems_solved[problem] = 0.0
 
+def sanity_check(canvas_util: Input.CanvasUtil, original_df, student_dict: Dict[str, Student]):
+    """:return: table of (column, student, old, new) for every computed score that differs from canvas"""
+    diff = _diff_module(canvas_util)
+    graded_rows = [student.canvas_index for student in student_dict.values() if student.canvas_index != -1]
+    discrepancies = diff.find_discrepancies(original_df, canvas_util.canvas_df, canvas_util.canvas_pset_names,
+                                            graded_rows)
+    diff.log_discrepancies(discrepancies)
+    return discrepancies
 
-def main():
-    # If there's unintended behavior, you can enable full logging to get an idea for what's going on under the hood.
 
-    log.basicConfig(level=LOGGING_LEVEL)
+def default_discrepancy_report_path(output_path: str) -> str:
+    # output.csv -> output_discrepancies.csv, next to the output
+    root, _ = os.path.splitext(output_path)
+    return f"{root}_discrepancies.csv"
 
-    student_dict, sessions = Input.load_kattis_info(KATTIS_JSON)
 
+def load_kattis(kattis_json: str, cache_folder: str, stream: bool, parse_workers: int, snapshot: bool) \
+        -> Tuple[Dict[str, Student], List[Session]]:
+    """
+    Reads the Kattis dump and computes each student's problems_solved from it.
+    :return: kattis username -> student, and every session
+    """
+    PROFILER.start_stage('kattis')
     # For each student, use the kattis info to compute a map [problem name -> score]
     # where score is 1 for solves and 0.5 for up-solves.
-    Student.populate_problems_solved_from_sessions(student_dict, sessions)
+    kattis_snapshot = None
+    if snapshot:
+        kattis_json = kattis_json if len(kattis_json) > 0 else Input.get_filename("Kattis JSON Dump")
+        kattis_snapshot = Snapshot.KattisSnapshot.open(os.path.join(cache_folder, 'kattis_snapshot'), kattis_json)
+    if kattis_snapshot is not None:
+        print("Loading Kattis snapshot...", end=' ')
+        student_dict, sessions = kattis_snapshot.load_models()
+        print("Done!")
+    elif stream:
+        student_dict, sessions = Input.stream_kattis_info(kattis_json)
+    elif parse_workers > 1:
+        student_dict, sessions = Input.load_kattis_info_parallel(kattis_json, parse_workers)
+    else:
+        student_dict, sessions = Input.load_kattis_info(kattis_json)
+        Student.populate_problems_solved_from_sessions(student_dict, sessions)
+    if snapshot and kattis_snapshot is None:
+        Snapshot.write_snapshot(os.path.join(cache_folder, 'kattis_snapshot'), student_dict.values(), sessions,
+                                kattis_json)
+    PROFILER.count('students_loaded', len(student_dict))
+    PROFILER.count('sessions_loaded', len(sessions))
+    return student_dict, sessions
 
-    # read in the canvas export
-    canvas_csv_filepath = CANVAS_CSV_PATH if len(CANVAS_CSV_PATH) > 0 \
-        else Input.get_filename("Complete Canvas Gradebook Export")
 
-    canvas_df = Input.load_canvas_info(canvas_csv_filepath)
-    original_df = canvas_df.copy(deep=True)
-
-    canvas_util = util.Input.CanvasUtil(canvas_df, CACHE_FOLDER)
+def match_and_grade(canvas_util: Input.CanvasUtil, student_dict: Dict[str, Student], sessions: List[Session],
+                    cache_folder: str, honors_rules: List[Tuple[str, str]], incremental: bool, honors_folder: str = ''):
+    """
+    Matches the students and sessions to the gradebook's rows and columns, and fills in the scores.
+    :param honors_folder: folder holding the honors problems files, the cache folder by default
+    """
+    PROFILER.start_stage('matching')
     # for each student, find and set their name in canvas
     canvas_util.populate_canvas_names(student_dict)
     # for each session in kattis, map it to one of the columns in canvas
     canvas_util.populate_canvas_session_names(sessions)
     # mark all the honors students
-    populate_honors(student_dict, canvas_df)
+    for student in student_dict.values():
+        student.honors = False
+    honors = Honors.HonorsRules(honors_rules, honors_folder or cache_folder)
+    honors.mark_students(student_dict, canvas_util.canvas_df, canvas_util.student_rows)
     # get rid of the points assigned to honors students.
-    clear_honors_points(student_dict)
+    honors.clear_points()
+
+    Student.set_canvas_row_indices(student_dict, canvas_util.student_rows)
 
-    Student.set_canvas_row_indices(student_dict, canvas_df)
+    PROFILER.start_stage('grading')
     # Compute Grades
-    canvas_util.populate_grades(student_dict, sessions)
+    if incremental:
+        # only regrade the columns whose sessions, roster or gradebook values changed since the last run
+        incremental_grader = Incremental.IncrementalGrader(cache_folder)
+        stale_columns = incremental_grader.plan(canvas_util.canvas_df, canvas_util.canvas_pset_names, student_dict,
+                                                sessions, honors.fingerprint())
+        incremental_grader.apply_previous(canvas_util.canvas_df)
+        canvas_util.populate_grades(student_dict, sessions, stale_columns)
+        incremental_grader.save(canvas_util.canvas_df)
+        incremental_grader.report()
+    else:
+        canvas_util.populate_grades(student_dict, sessions)
 
-    canvas_util.canvas_df.to_csv('output.csv', index=False, quotechar='"')
-    print("Saved results to output.csv")
+
+def export_and_check(canvas_util: Input.CanvasUtil, original_df, student_dict: Dict[str, Student], output_path: str,
+                     delta_export: bool, discrepancy_report_path: str) -> int:
+    """
+    Saves the graded gradebook and the sanity check's discrepancies.
+    :return: the number of discrepancies
+    """
+    PROFILER.start_stage('export')
+
+    diff = _diff_module(canvas_util)
+    if delta_export:
+        diff.export_changes(original_df, canvas_util.canvas_df, canvas_util.canvas_pset_names,
+                            Input.CANVAS_ID_COLUMNS, output_path)
+    elif isinstance(canvas_util.canvas_df, Gradebook.CsvGradebook):
+        canvas_util.canvas_df.to_csv(output_path)
+        print(f"Saved results to {output_path}")
+    else:
+        canvas_util.canvas_df.to_csv(output_path, index=False, quotechar='"')
+        print(f"Saved results to {output_path}")
 
     # Sanity Check
+    PROFILER.start_stage('sanity_check')
     print("Running sanity check...")
-    # original_df = original_df[original_df.select_dtypes(include=['number']).columns].fillna(0)
-    discrepancy_count = 0
-    for col in sorted(list(canvas_util.canvas_pset_names)):
-        if original_df[col].sum() == 0 or 'base' in col.lower():
-            # Grades have not been entered in this column yet, so we don't check for discrepancies
-            continue
-        for _, student in student_dict.items():
-            if student.canvas_index != -1:
-                if numpy.isnan(canvas_df.at[student.canvas_index, col]) and numpy.isnan(original_df.at[student.canvas_index, col]):
-                    continue
-                if canvas_df.at[student.canvas_index, col] != original_df.at[student.canvas_index, col]:
-                    discrepancy_count += 1
-                    log.warning(
-                        f"Discrepancy: {col}::{student.canvas_name} Canvas score of {original_df.at[student.canvas_index, col]}"
-                        f" but computed score is {canvas_df.at[student.canvas_index, col]}"
-                    )
+    discrepancies = sanity_check(canvas_util, original_df, student_dict)
+    diff.write_discrepancies(discrepancies, discrepancy_report_path or default_discrepancy_report_path(output_path))
+    PROFILER.end_stage()
+    return len(discrepancies)
+
+
+def save_profile(profile_report_path: str, cprofile_path: str):
+    if len(profile_report_path) > 0:
+        PROFILER.write_report(profile_report_path)
+    if len(cprofile_path) > 0:
+        PROFILER.dump_cprofile(cprofile_path)
+
+
+def main(
+        kattis_json: str = KATTIS_JSON,
+        canvas_csv_path: str = CANVAS_CSV_PATH,
+        cache_folder: str = CACHE_FOLDER,
+        output_path: str = OUTPUT_PATH,
+        stream: bool = STREAM_KATTIS_JSON,
+        interactive: bool = True,
+        incremental: bool = INCREMENTAL,
+        discrepancy_report_path: str = '',
+        selective_load: bool = SELECTIVE_CANVAS_LOAD,
+        delta_export: bool = DELTA_EXPORT,
+        profile_report_path: str = '',
+        cprofile_path: str = '',
+        honors_rules: Optional[List[Tuple[str, str]]] = None,
+        backend: str = GRADEBOOK_BACKEND,
+        auto_accept_score: float = AUTO_ACCEPT_SCORE,
+        snapshot: bool = KATTIS_SNAPSHOT,
+        parse_workers: int = PARSE_WORKERS,
+        honors_folder: str = ''
+) -> Dict:
+    """
+    Runs the whole pipeline for one Kattis dump and one Canvas gradebook.
+    :param profile_report_path: if set, record CPU time, memory and work counts per stage and save them here as JSON
+    :param cprofile_path: if set, run cProfile during grading and dump its stats here
+    :param honors_rules: (section regex, honors problems file) pairs, HONORS_RULES by default
+    :param backend: 'pandas' or 'csv', see GRADEBOOK_BACKEND
+    :param auto_accept_score: see AUTO_ACCEPT_SCORE, only used when not interactive
+    :param snapshot: see KATTIS_SNAPSHOT
+    :param parse_workers: see PARSE_WORKERS; ignored when streaming
+    :param honors_folder: folder holding the honors problems files, the cache folder by default
+    :return: summary of the run with the time spent in each stage and the number of discrepancies
+    """
+    # If there's unintended behavior, you can enable full logging to get an idea for what's going on under the hood.
+
+    log.basicConfig(level=LOGGING_LEVEL)
+    honors_rules = HONORS_RULES if honors_rules is None else honors_rules
+    start = time.perf_counter()
+    PROFILER.reset(enabled=len(profile_report_path) > 0, cprofile_stage='grading' if len(cprofile_path) > 0 else None)
+
+    student_dict, sessions = load_kattis(kattis_json, cache_folder, stream, parse_workers, snapshot)
+
+    PROFILER.start_stage('canvas')
+
+    # read in the canvas export
+    canvas_csv_filepath = canvas_csv_path if len(canvas_csv_path) > 0 \
+        else Input.get_filename("Complete Canvas Gradebook Export")
+
+    canvas_df = Input.load_canvas_info(canvas_csv_filepath, selective_load, backend)
+    original_df = canvas_df.copy()
+
+    canvas_util = Input.CanvasUtil(canvas_df, cache_folder, interactive, auto_accept_score)
+    match_and_grade(canvas_util, student_dict, sessions, cache_folder, honors_rules, incremental, honors_folder)
+
+    discrepancy_count = export_and_check(canvas_util, original_df, student_dict, output_path, delta_export,
+                                         discrepancy_report_path)
     if LOGGING_LEVEL == log.ERROR:
         print(f"Found {discrepancy_count} discrepancies. Set LOGGING_LEVEl to log.WARNING and run the program again "
               f"to see them...")
 
+    timings = PROFILER.timings()
+    timings['total'] = time.perf_counter() - start
+    save_profile(profile_report_path, cprofile_path)
     print("All done! Terminating...")
+    return {'timings': timings, 'discrepancies': discrepancy_count}
+
+
+def _job_path(path: str, job: 'Batch.BatchJob') -> str:
+    # report.json -> <job's output folder>/report_<job's output name>.json, so jobs running at once never overwrite
+    # each other's reports, even when their outputs have the same name in different folders
+    if len(path) == 0:
+        return path
+    root, extension = os.path.splitext(os.path.basename(path))
+    output_folder, output_name = os.path.split(job.output_path)
+    job_name, _ = os.path.splitext(output_name)
+    return os.path.join(output_folder, f"{root}_{job_name}{extension}")
+
+
+def run_job(options: Dict, job: 'Batch.BatchJob') -> Dict:
+    """
+    Runs main() for a single batch job, without ever prompting.
+    :param options: main()'s keyword arguments from the command line, shared by every job (see main_options)
+    """
+    # each job gets its own problem ids, username ids and solve rows, even when a worker process runs several jobs
+    PROBLEMS.reset()
+    USERNAMES.reset()
+    SOLVES.reset()
+    os.makedirs(job.cache_folder, exist_ok=True)
+    job_options = dict(options, interactive=False)
+    for report in ('discrepancy_report_path', 'profile_report_path', 'cprofile_path'):
+        job_options[report] = _job_path(job_options.get(report, ''), job)
+    # the honors problems files are the job's own if its cache folder has them, and otherwise the shared ones in
+    # --cache-folder; a job graded without them would silently keep the honors students' points
+    honors_rules = job_options.get('honors_rules') or HONORS_RULES
+    job_honors = Honors.HonorsRules(honors_rules, job.cache_folder)
+    shared_honors = Honors.HonorsRules(honors_rules, job_options.get('honors_folder') or CACHE_FOLDER)
+    if len(job_honors.missing_files()) == 0:
+        job_options['honors_folder'] = job_honors.cache_folder
+    elif len(shared_honors.missing_files()) == 0:
+        job_options['honors_folder'] = shared_honors.cache_folder
+    else:
+        return {'error': f"no honors problems file {', '.join(shared_honors.missing_files())} in "
+                         f"{job.cache_folder} or {shared_honors.cache_folder}"}
+    try:
+        return main(job.kattis_json, job.canvas_csv, job.cache_folder, job.output_path, **job_options)
+    except SystemExit:
+        return {'error': 'stopped early, see the log above'}
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def watch(
+        kattis_json: str,
+        canvas_csv_path: str,
+        cache_folder: str = CACHE_FOLDER,
+        output_path: str = OUTPUT_PATH,
+        stream: bool = STREAM_KATTIS_JSON,
+        incremental: bool = INCREMENTAL,
+        discrepancy_report_path: str = '',
+        selective_load: bool = SELECTIVE_CANVAS_LOAD,
+        delta_export: bool = DELTA_EXPORT,
+        profile_report_path: str = '',
+        cprofile_path: str = '',
+        honors_rules: Optional[List[Tuple[str, str]]] = None,
+        backend: str = GRADEBOOK_BACKEND,
+        auto_accept_score: float = AUTO_ACCEPT_SCORE,
+        snapshot: bool = KATTIS_SNAPSHOT,
+        parse_workers: int = PARSE_WORKERS,
+        honors_folder: str = '',
+        interval: float = WATCH_INTERVAL,
+        port: int = WATCH_PORT
+):
+    """
+    Keeps running and regrades whenever a new Kattis or Canvas export shows up, without ever prompting.
+    The parsed students and sessions, the gradebook with its name index and the name map stay in memory between runs,
+    and only the export that changed is read again. The current grades and the last run are served over HTTP.
+    The other options are the same as main()'s, and the reports are saved again after every run.
+    :param kattis_json: the Kattis export, or a folder new exports are saved into (the newest .json is used)
+    :param canvas_csv_path: the Canvas gradebook export, or a folder of them (the newest .csv is used)
+    """
+    log.basicConfig(level=LOGGING_LEVEL)
+    honors_rules = HONORS_RULES if honors_rules is None else honors_rules
+    watcher = Watch.InputWatcher({
+        'kattis': (kattis_json, '.json'),
+        'canvas': (canvas_csv_path, '.csv'),
+        # decisions entered in the review file are applied by rematching
+        'review': (os.path.join(cache_folder, 'match_review.csv'), '.csv')
+    })
+    server = Watch.StatusServer(port=port)
+    server.start()
+
+    # None until the first export of each kind has been read
+    student_dict: Optional[Dict[str, Student]] = None
+    sessions: List[Session] = []
+    original_df = None
+    canvas_util: Optional[Input.CanvasUtil] = None
+    runs = 0
+    print(f"Watching {kattis_json} and {canvas_csv_path} for new exports. Press Ctrl+C to stop.")
+    try:
+        # changes are picked up once a file looks the same on two polls, so the exports already there are read
+        # after a short first wait
+        watcher.poll()
+        wait = min(interval, 1.0)
+        while True:
+            time.sleep(wait)
+            wait = interval
+            changed = watcher.poll()
+            if len(changed) == 0 or (student_dict is None and 'kattis' not in changed) or \
+                    (original_df is None and 'canvas' not in changed):
+                continue
+            start = time.perf_counter()
+            PROFILER.reset(enabled=len(profile_report_path) > 0,
+                           cprofile_stage='grading' if len(cprofile_path) > 0 else None)
+            try:
+                if 'kattis' in changed:
+                    # new problem ids, username ids and solve rows for the new dump
+                    PROBLEMS.reset()
+                    USERNAMES.reset()
+                    SOLVES.reset()
+                    student_dict = None
+                    student_dict, sessions = load_kattis(watcher.current('kattis'), cache_folder, stream,
+                                                         parse_workers, snapshot)
+                else:
+                    # the honors rules cleared some scores last time, so start over from the parsed sessions
+                    PROFILER.start_stage('kattis')
+                    SOLVES.clear()
+                    Student.populate_problems_solved_from_sessions(student_dict, sessions)
+
+                PROFILER.start_stage('canvas')
+                if 'canvas' in changed:
+                    original_df = None
+                    original_df = Input.load_canvas_info(watcher.current('canvas'), selective_load, backend)
+                    names_map = canvas_util.names_map if canvas_util is not None else None
+                    canvas_util = Input.CanvasUtil(original_df.copy(), cache_folder, False, auto_accept_score)
+                    # the name map was read once; matches to students no longer in the gradebook are redone
+                    canvas_util.names_map = names_map
+                else:
+                    # regrade a fresh copy, keeping the name index and name matcher
+                    canvas_util.canvas_df = original_df.copy()
+
+                match_and_grade(canvas_util, student_dict, sessions, cache_folder, honors_rules, incremental,
+                                honors_folder)
+                discrepancy_count = export_and_check(canvas_util, original_df, student_dict, output_path,
+                                                     delta_export, discrepancy_report_path)
+            except (SystemExit, Exception) as e:
+                # keep serving the last good grades; a fixed export is picked up on the next poll
+                log.error(f"Regrading failed, waiting for new exports: {e}")
+                PROFILER.end_stage()
+                watcher.take(changed)
+                watcher.take_current(['review'])
+                continue
+            watcher.take(changed)
+            # the run rewrote the review file itself, which is no reason to run again
+            watcher.take_current(['review'])
+            runs += 1
+
+            timings = PROFILER.timings()
+            timings['total'] = time.perf_counter() - start
+            save_profile(profile_report_path, cprofile_path)
+            graded_rows = {student.canvas_name: student.canvas_index for student in student_dict.values()
+                           if student.canvas_index != -1}
+            server.publish(Watch.grade_table(canvas_util.canvas_df, canvas_util.canvas_pset_names, graded_rows), {
+                'run': runs,
+                'finished': datetime.now().isoformat(timespec='seconds'),
+                'changed': sorted(changed),
+                'kattis_json': watcher.current('kattis'),
+                'canvas_csv': watcher.current('canvas'),
+                'timings': timings,
+                'discrepancies': discrepancy_count
+            })
+            print(f"Regraded for new {' and '.join(sorted(changed))} input in {timings['total']:.2f}s "
+                  f"({discrepancy_count} discrepancies).")
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    finally:
+        server.stop()
+
+
+def fetch_inputs(downloads: List['Fetch.Download']) -> bool:
+    """
+    Downloads every export at once, skipping the ones that haven't changed since they were last downloaded.
+    :return: False if an export failed to download and there is no earlier copy of it to grade with
+    """
+    from util import Fetch
+
+    # exports shared by several jobs are downloaded once
+    downloads = list({download.path: download for download in downloads}.values())
+    results = Fetch.fetch_all(downloads, FETCH_CONNECTIONS)
+    missing = [download.path for download, result in zip(downloads, results)
+               if result.startswith('failed') and not os.path.isfile(download.path)]
+    for path in missing:
+        log.error(f"No copy of {path} to grade with.")
+    return len(missing) == 0
+
+
+def _downloads(args: argparse.Namespace) -> List['Fetch.Download']:
+    # the exports to download for a single run, from --kattis-url and --canvas-url
+    from util import Batch
+
+    return Batch.BatchJob(args.kattis_json, args.canvas_csv, args.cache_folder, args.output, args.kattis_url,
+                          args.canvas_url, {'kattis': _parse_headers(args.kattis_header),
+                                            'canvas': _parse_headers(args.canvas_header)}).downloads()
+
+
+def _parse_headers(headers: Optional[List[str]]) -> Dict[str, str]:
+    # 'Name: value' pairs from the command line
+    return {name.strip(): value.strip() for name, _, value in (header.partition(':') for header in headers or [])}
+
+
+def _honors_rule(rule: str) -> Tuple[str, str]:
+    # 'SECTION_REGEX=PROBLEMS_FILE'; the regex may itself contain '=', the file name may not
+    section_regex, separator, problems_file = rule.rpartition('=')
+    if len(separator) == 0 or len(section_regex) == 0 or len(problems_file) == 0:
+        raise argparse.ArgumentTypeError(f"expected SECTION_REGEX=PROBLEMS_FILE, got '{rule}'")
+    return section_regex, problems_file
+
+
+def main_options(args: argparse.Namespace) -> Dict:
+    """main()'s keyword arguments from the command line; plain values, so they can be sent to batch workers."""
+    return {
+        'stream': args.stream,
+        'interactive': not args.non_interactive,
+        'incremental': args.incremental,
+        'discrepancy_report_path': args.discrepancy_report,
+        'selective_load': args.selective_load,
+        'delta_export': args.delta_export,
+        'profile_report_path': args.profile_report,
+        'cprofile_path': args.cprofile,
+        'honors_rules': args.honors_rule,
+        'backend': args.backend,
+        'auto_accept_score': args.auto_accept_score,
+        'snapshot': args.snapshot,
+        'parse_workers': args.parse_workers,
+        'honors_folder': args.cache_folder
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fills a Canvas gradebook with Kattis problem set scores.")
+    parser.add_argument('--kattis-json', default=KATTIS_JSON, help="path to the Kattis JSON export")
+    parser.add_argument('--canvas-csv', default=CANVAS_CSV_PATH, help="path to the Canvas gradebook export")
+    parser.add_argument('--cache-folder', default=CACHE_FOLDER,
+                        help="folder holding the name map and honors problems; with --batch, the honors problems of "
+                             "jobs whose own cache folder doesn't have them")
+    parser.add_argument('--output', default=OUTPUT_PATH, help="where to write the updated gradebook")
+    parser.add_argument('--discrepancy-report', default='',
+                        help="where to write the sanity check's discrepancies, as .csv or .json "
+                             "(default: next to the output)")
+    parser.add_argument('--stream', action='store_true', default=STREAM_KATTIS_JSON,
+                        help="stream the Kattis dump instead of loading it all at once")
+    parser.add_argument('--parse-workers', type=int, default=PARSE_WORKERS, metavar='N',
+                        help="parse the Kattis sessions with N worker processes")
+    parser.add_argument('--snapshot', action='store_true', default=KATTIS_SNAPSHOT,
+                        help="keep a memory-mapped snapshot of the parsed Kattis dump in the cache folder and load it "
+                             "instead of the JSON while the dump is unchanged")
+    parser.add_argument('--incremental', action='store_true', default=INCREMENTAL,
+                        help="only regrade columns whose inputs changed since the last run")
+    parser.add_argument('--selective-load', action='store_true', default=SELECTIVE_CANVAS_LOAD,
+                        help="only read the gradebook's student id and problem set columns")
+    parser.add_argument('--delta-export', action='store_true', default=DELTA_EXPORT,
+                        help="only export the students and columns whose grades changed")
+    parser.add_argument('--profile-report', default='', metavar='PATH',
+                        help="record time, CPU, memory and work counts for each stage into a JSON report")
+    parser.add_argument('--cprofile', default='', metavar='PATH', help="dump cProfile stats for the grading stage")
+    parser.add_argument('--honors-rule', action='append', type=_honors_rule, metavar='SECTION_REGEX=PROBLEMS_FILE',
+                        help="students in sections matching the regex don't get points for the problems in the file "
+                             "(in the cache folder); may be repeated (default: 2\\d{2}=honors_problems.in)")
+    parser.add_argument('--backend', choices=Input.BACKENDS, default=GRADEBOOK_BACKEND,
+                        help="gradebook backend; 'csv' never imports pandas or numpy and starts much faster")
+    parser.add_argument('--non-interactive', action='store_true',
+                        help="never prompt for input; uncertain name matches go to cache/match_review.csv")
+    parser.add_argument('--auto-accept-score', type=float, default=AUTO_ACCEPT_SCORE, metavar='SCORE',
+                        help="with --non-interactive, accept possible name matches at least this similar (0-1)")
+    parser.add_argument('--batch', metavar='MANIFEST',
+                        help="JSON manifest of jobs (kattis_json, canvas_csv, cache_folder, output_path) to run in "
+                             "parallel; each job's reports are written next to its output as "
+                             "<report name>_<output name>")
+    parser.add_argument('--kattis-url', default='',
+                        help="download the Kattis export from here first (to --kattis-json, or the cache folder); "
+                             "it is only downloaded again once it changes")
+    parser.add_argument('--canvas-url', default='',
+                        help="download the Canvas gradebook from here first, like --kattis-url")
+    parser.add_argument('--kattis-header', action='append', metavar='NAME:VALUE',
+                        help="request header for --kattis-url, e.g. a cookie; $VARIABLES are expanded")
+    parser.add_argument('--canvas-header', action='append', metavar='NAME:VALUE',
+                        help="request header for --canvas-url, e.g. 'Authorization: Bearer $CANVAS_TOKEN'")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes for --batch (default: CPU count)")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and regrade whenever a new export appears at --kattis-json or --canvas-csv "
+                             "(a file, or a folder exports are saved into)")
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, help="seconds between checks for --watch")
+    parser.add_argument('--port', type=int, default=WATCH_PORT,
+                        help="local port --watch serves the current grades (/grades) and last run (/status) on")
+    return parser.parse_args()
+
 
+if __name__ == '__main__':
+    args = parse_args()
+    if args.kattis_url or args.canvas_url:
+        args.kattis_json = args.kattis_json or os.path.join(args.cache_folder, 'kattis.json')
+        args.canvas_csv = args.canvas_csv or os.path.join(args.cache_folder, 'gradebook.csv')
+    if args.batch:
+        from util import Batch
 
-main()
+        batch_jobs = Batch.load_manifest(args.batch)
+        # jobs whose exports couldn't be downloaded fail on their own, so the rest still run
+        fetch_inputs([download for job in batch_jobs for download in job.downloads()])
+        Batch.print_summary(batch_jobs, Batch.run_batch(batch_jobs, functools.partial(run_job, main_options(args)),
+                                                        args.workers))
+    elif (args.kattis_url or args.canvas_url) and not fetch_inputs(_downloads(args)):
+        exit(1)
+    elif args.watch:
+        # watch mode never prompts
+        watch_options = {name: value for name, value in main_options(args).items() if name != 'interactive'}
+        watch(args.kattis_json or Input.get_filename("Kattis JSON Dump"),
+              args.canvas_csv or Input.get_filename("Complete Canvas Gradebook Export"), args.cache_folder,
+              args.output, interval=args.interval, port=args.port, **watch_options)
+    else:
+        main(args.kattis_json, args.canvas_csv, args.cache_folder, args.output, **main_options(args))
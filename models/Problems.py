@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import struct
+from array import array
+from typing import Dict, Iterable, Iterator, List, MutableMapping, Optional, Sequence
+
+# int.bit_count is only available from python 3.10
+popcount = int.bit_count if hasattr(int, 'bit_count') else lambda bits: bin(bits).count('1')
+
+
+class ProblemTable:
+    """Interns problem names to small integer ids so each name is stored once per run."""
+
+    __slots__ = ('_ids', '_names')
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+
+    def intern(self, problem_name: str) -> int:
+        problem_id = self._ids.get(problem_name)
+        if problem_id is None:
+            problem_id = len(self._names)
+            self._ids[problem_name] = problem_id
+            self._names.append(problem_name)
+        return problem_id
+
+    def get(self, problem_name: str) -> Optional[int]:
+        return self._ids.get(problem_name)
+
+    def name(self, problem_id: int) -> str:
+        return self._names[problem_id]
+
+    def reset(self):
+        self._ids.clear()
+        self._names.clear()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+class SolveTable:
+    """
+    Student x problem scores for every student, stored row-major in a single byte array.
+    Scores are kept in half points (0 = unsolved, 1 = up-solved, 2 = solved).
+    Each row's solved and up-solved problems are also kept as bitsets over the problem ids, so counting a row's
+    solves among a set of problems is one AND and a popcount.
+    """
+
+    __slots__ = ('data', 'rows', 'stride', 'solved_bits', 'upsolved_bits')
+
+    def __init__(self):
+        self.data = array('B')
+        self.rows = 0
+        self.stride = 0
+        self.solved_bits: List[int] = []
+        self.upsolved_bits: List[int] = []
+
+    def add_row(self) -> int:
+        self.data.extend(bytes(self.stride))
+        self.solved_bits.append(0)
+        self.upsolved_bits.append(0)
+        self.rows += 1
+        return self.rows - 1
+
+    def _ensure_columns(self, columns: int):
+        if columns <= self.stride:
+            return
+        stride = max(columns, 2 * self.stride, 16)
+        data = array('B', bytes(self.rows * stride))
+        for row in range(self.rows):
+            data[row * stride:row * stride + self.stride] = self.data[row * self.stride:(row + 1) * self.stride]
+        self.data = data
+        self.stride = stride
+
+    def get(self, row: int, problem_id: int) -> float:
+        if problem_id >= self.stride:
+            return 0.0
+        return self.data[row * self.stride + problem_id] / 2
+
+    def _set_bits(self, row: int, problem_id: int, half_points: int):
+        bit = 1 << problem_id
+        self.solved_bits[row] = self.solved_bits[row] | bit if half_points == 2 else self.solved_bits[row] & ~bit
+        self.upsolved_bits[row] = self.upsolved_bits[row] | bit if half_points == 1 else self.upsolved_bits[row] & ~bit
+
+    def set(self, row: int, problem_id: int, score: float):
+        self._ensure_columns(problem_id + 1)
+        half_points = round(score * 2)
+        self.data[row * self.stride + problem_id] = half_points
+        self._set_bits(row, problem_id, half_points)
+
+    def raise_score(self, row: int, problem_id: int, score: float):
+        """Sets the score only if it is higher than the current one."""
+        self._ensure_columns(problem_id + 1)
+        half_points = round(score * 2)
+        position = row * self.stride + problem_id
+        if self.data[position] < half_points:
+            self.data[position] = half_points
+            # scores only go up here, so an up-solve can only become a solve
+            if half_points == 2:
+                self.solved_bits[row] |= 1 << problem_id
+                self.upsolved_bits[row] &= ~(1 << problem_id)
+            else:
+                self.upsolved_bits[row] |= 1 << problem_id
+
+    def count(self, row: int, problem_mask: int, score: float) -> int:
+        """
+        Number of the given problems the row has exactly this score for.
+        :param problem_mask: bitset of the problem ids, see mask
+        """
+        bits = self.solved_bits[row] if score == 1 else self.upsolved_bits[row] if score == 0.5 else 0
+        return popcount(bits & problem_mask)
+
+    def clear_mask(self, row: int, problem_mask: int):
+        """Zeroes the row's scores for every problem in the bitset."""
+        self.solved_bits[row] &= ~problem_mask
+        self.upsolved_bits[row] &= ~problem_mask
+        for problem_id in iter_bits(problem_mask):
+            if problem_id < self.stride:
+                self.data[row * self.stride + problem_id] = 0
+
+    def clear(self):
+        """Zeroes every score, keeping the rows and columns."""
+        self.data = array('B', bytes(len(self.data)))
+        self.solved_bits = [0] * self.rows
+        self.upsolved_bits = [0] * self.rows
+
+    def reset(self):
+        self.data = array('B')
+        self.rows = 0
+        self.stride = 0
+        self.solved_bits = []
+        self.upsolved_bits = []
+
+    def to_bytes(self, row: int) -> bytes:
+        """
+        The row's scores as its two bitsets, a few bytes per student instead of a map of problem names to scores.
+        The bits are problem ids, so the PROBLEMS table's names are needed to read them in another run.
+        """
+        solved, upsolved = self.solved_bits[row], self.upsolved_bits[row]
+        solved_bytes = solved.to_bytes((solved.bit_length() + 7) // 8, 'little')
+        upsolved_bytes = upsolved.to_bytes((upsolved.bit_length() + 7) // 8, 'little')
+        return struct.pack('<I', len(solved_bytes)) + solved_bytes + upsolved_bytes
+
+    def load_bytes(self, row: int, data: bytes, problem_ids: Optional[Sequence[int]] = None):
+        """
+        Restores scores written by to_bytes into the row, on top of the ones it already has.
+        :param problem_ids: the current id of each problem id in data, if they were interned in another order
+        """
+        solved_length, = struct.unpack_from('<I', data)
+        solved = int.from_bytes(data[4:4 + solved_length], 'little')
+        upsolved = int.from_bytes(data[4 + solved_length:], 'little')
+        if problem_ids is not None:
+            solved = mask(problem_ids[problem_id] for problem_id in iter_bits(solved))
+            upsolved = mask(problem_ids[problem_id] for problem_id in iter_bits(upsolved))
+        self._ensure_columns(max(solved.bit_length(), upsolved.bit_length()))
+        # the same as raising each score: an up-solve of a problem the row has solved stays a solve
+        solved |= self.solved_bits[row]
+        upsolved = (upsolved | self.upsolved_bits[row]) & ~solved
+        self.solved_bits[row] = solved
+        self.upsolved_bits[row] = upsolved
+        start = row * self.stride
+        for problem_id in iter_bits(upsolved):
+            self.data[start + problem_id] = 1
+        for problem_id in iter_bits(solved):
+            self.data[start + problem_id] = 2
+
+
+def mask(problem_ids: Iterable[int]) -> int:
+    """Bitset with the bit of every problem id set."""
+    bits = 0
+    for problem_id in problem_ids:
+        bits |= 1 << problem_id
+    return bits
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """The problem ids set in a bitset, lowest first."""
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+PROBLEMS = ProblemTable()
+SOLVES = SolveTable()
+
+
+class ProblemScores(MutableMapping):
+    """
+    A student's row of the shared SolveTable, exposed as a problem name -> score mapping.
+    Like a defaultdict(float), unknown problems read as 0.0.
+    """
+
+    __slots__ = ('row',)
+
+    def __init__(self, row: int):
+        self.row = row
+
+    def __getitem__(self, problem_name: str) -> float:
+        problem_id = PROBLEMS.get(problem_name)
+        return 0.0 if problem_id is None else SOLVES.get(self.row, problem_id)
+
+    def __setitem__(self, problem_name: str, score: float):
+        SOLVES.set(self.row, PROBLEMS.intern(problem_name), score)
+
+    def __delitem__(self, problem_name: str):
+        problem_id = PROBLEMS.get(problem_name)
+        if problem_id is not None:
+            SOLVES.set(self.row, problem_id, 0.0)
+
+    def raise_score(self, problem_id: int, score: float):
+        SOLVES.raise_score(self.row, problem_id, score)
+
+    @property
+    def solved(self) -> int:
+        """Bitset of the ids of the problems solved."""
+        return SOLVES.solved_bits[self.row]
+
+    @property
+    def upsolved(self) -> int:
+        """Bitset of the ids of the problems only up-solved."""
+        return SOLVES.upsolved_bits[self.row]
+
+    def to_bytes(self) -> bytes:
+        return SOLVES.to_bytes(self.row)
+
+    def load_bytes(self, data: bytes, problem_ids: Optional[Sequence[int]] = None):
+        SOLVES.load_bytes(self.row, data, problem_ids)
+
+    def __iter__(self) -> Iterator[str]:
+        for problem_id in range(min(len(PROBLEMS), SOLVES.stride)):
+            if SOLVES.get(self.row, problem_id) > 0:
+                yield PROBLEMS.name(problem_id)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
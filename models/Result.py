@@ -1,34 +1,158 @@
 from __future__ import annotations
 
-from typing import List
+from array import array
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from models.Problems import PROBLEMS, ProblemTable
+
+# usernames and team names repeat in every session, so they are interned to ids the same way as problem names
+USERNAMES = ProblemTable()
+
+
+class ResultTable:
+    """
+    All of a session's results, stored column by column: one flat array per field, with offsets into the flat
+    member, problem id and solve time arrays. A few bytes per result instead of an object per result and per list.
+    """
+
+    __slots__ = ('team_names', 'solved_counts', 'total_times', 'member_offsets', 'members', 'problem_offsets',
+                 'problem_ids', 'solve_times')
+
+    def __init__(self):
+        self.team_names = array('I')
+        self.solved_counts = array('H')
+        self.total_times = array('I')
+        # the members of result i are members[member_offsets[i]:member_offsets[i + 1]], and so on for problems
+        self.member_offsets = array('I', [0])
+        self.members = array('I')
+        self.problem_offsets = array('I', [0])
+        self.problem_ids = array('I')
+        # solve time of each problem in problem_ids
+        self.solve_times = array('I')
+
+    @classmethod
+    def from_dicts(cls, result_dicts: Iterable[dict]) -> ResultTable:
+        table = cls()
+        for result_dict in result_dicts:
+            solved = Result.solved_problems(result_dict)
+            table.append(
+                result_dict['team_name'],
+                result_dict['solved_count'],
+                result_dict['total_time'],
+                result_dict['members'],
+                [problem['problem_name'] for problem in solved],
+                [int(problem['solve_time']) for problem in solved]
+            )
+        table.compact()
+        return table
+
+    @classmethod
+    def from_columns(cls, team_names: array, solved_counts: array, total_times: array, member_offsets: array,
+                     members: array, problem_offsets: array, problem_ids: array, solve_times: array) -> ResultTable:
+        """
+        A table over columns that are already built, e.g. sliced from a snapshot: names as USERNAMES ids, problems
+        as PROBLEMS ids, and offsets starting at 0.
+        """
+        table = cls()
+        table.team_names = team_names
+        table.solved_counts = solved_counts
+        table.total_times = total_times
+        table.member_offsets = member_offsets
+        table.members = members
+        table.problem_offsets = problem_offsets
+        table.problem_ids = problem_ids
+        table.solve_times = solve_times
+        return table
+
+    def append(self, team_name: str, solved_count: int, total_time: int, members: Iterable[str],
+               problems: Iterable[str], solve_times: Optional[Iterable[int]] = None):
+        self.team_names.append(USERNAMES.intern(team_name))
+        self.solved_counts.append(solved_count)
+        self.total_times.append(total_time)
+        self.members.extend(USERNAMES.intern(member) for member in members)
+        self.member_offsets.append(len(self.members))
+        start = len(self.problem_ids)
+        self.problem_ids.extend(PROBLEMS.intern(problem) for problem in problems)
+        self.problem_offsets.append(len(self.problem_ids))
+        self.solve_times.extend(solve_times if solve_times is not None else [0] * (len(self.problem_ids) - start))
+
+    def compact(self):
+        """Drops the extra capacity the arrays keep for appends, once the table is complete."""
+        for name in self.__slots__:
+            setattr(self, name, array(getattr(self, name).typecode, getattr(self, name)))
+
+    def members_and_problems(self) -> Iterator[Tuple[List[str], array]]:
+        """(member usernames, problem ids) of every result, without building Result views."""
+        member_offsets, problem_offsets = self.member_offsets, self.problem_offsets
+        for i in range(len(self.team_names)):
+            yield ([USERNAMES.name(member) for member in self.members[member_offsets[i]:member_offsets[i + 1]]],
+                   self.problem_ids[problem_offsets[i]:problem_offsets[i + 1]])
+
+    def usernames(self) -> Set[str]:
+        """The usernames of everyone with a result in the session."""
+        return {USERNAMES.name(member) for member in set(self.members)}
+
+    def __len__(self) -> int:
+        return len(self.team_names)
+
+    def __getitem__(self, index: int) -> Result:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return Result(self, index)
+
+    def __iter__(self) -> Iterator[Result]:
+        return (Result(self, index) for index in range(len(self)))
 
 
 class Result:
+    """One row of a session's ResultTable."""
+
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table: ResultTable, index: int):
+        self.table = table
+        self.index = index
 
     @classmethod
     def from_dict(cls, result_dict: dict) -> Result:
-        team_name = result_dict['team_name']
-        solved_count = result_dict['solved_count']
-        total_time = result_dict['total_time']
-        members = result_dict['members']
-        problems = [
-            problem['problem_name'] for problem in filter(
-                lambda prob: 'solve_time' in prob,
-                result_dict['problems']
-            )
-        ]
-        # problems = [problem['problem_name'] for problem in result_dict['problems']]
-        return Result(
-            team_name,
-            solved_count,
-            total_time,
-            members,
-            problems
-        )
-
-    def __init__(self, team_name: str, solved_count: int, total_time: int, members: List[str], problems: List[str]):
-        self.team_name = team_name
-        self.solved_count = solved_count
-        self.total_time = total_time
-        self.members = members
-        self.problems = problems
+        """A result on its own, backed by a one-row ResultTable."""
+        return ResultTable.from_dicts([result_dict])[0]
+
+    @staticmethod
+    def solved_problems(result_dict: dict) -> List[dict]:
+        """The result's problem dicts that were solved, i.e. that have a solve_time."""
+        return [problem for problem in result_dict['problems'] if 'solve_time' in problem]
+
+    @property
+    def team_name(self) -> str:
+        return USERNAMES.name(self.table.team_names[self.index])
+
+    @property
+    def solved_count(self) -> int:
+        return self.table.solved_counts[self.index]
+
+    @property
+    def total_time(self) -> int:
+        return self.table.total_times[self.index]
+
+    @property
+    def members(self) -> Tuple[str, ...]:
+        offsets = self.table.member_offsets
+        members = self.table.members[offsets[self.index]:offsets[self.index + 1]]
+        return tuple(USERNAMES.name(member) for member in members)
+
+    @property
+    def problem_ids(self) -> array:
+        offsets = self.table.problem_offsets
+        return self.table.problem_ids[offsets[self.index]:offsets[self.index + 1]]
+
+    @property
+    def solve_times(self) -> array:
+        offsets = self.table.problem_offsets
+        return self.table.solve_times[offsets[self.index]:offsets[self.index + 1]]
+
+    @property
+    def problems(self) -> List[str]:
+        return [PROBLEMS.name(problem_id) for problem_id in self.problem_ids]
@@ -1,10 +1,14 @@
 from __future__ import annotations
-from typing import Dict, List, Set
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 
-from models.Result import Result
+from models.Problems import PROBLEMS, mask
+from models.Result import ResultTable
+from util.Profiling import profiled
 
 
 class Session:
+    __slots__ = ('name', 'canvas_name', 'starttime', 'length', 'problems', '_results', '_result_dicts', 'is_upsolve',
+                 '_problem_mask')
 
     # @staticmethod
     # def read_dict(session_dict: Dict):
@@ -21,15 +25,37 @@ class Session:
             starttime: str,
             length: str,
             problems: Set[str],
-            results: List
+            results: ResultTable
     ):
         self.name: str = name
         self.canvas_name: str = ''
         self.starttime: str = starttime
         self.length: str = length
         self.problems: Set[str] = problems
-        self.results: List[Result] = results
+        self._result_dicts: Optional[List[dict]] = None
+        self.results: ResultTable = results
         self.is_upsolve: bool = False
+        self._problem_mask: Optional[int] = None
+
+    @property
+    def problem_mask(self) -> int:
+        """Bitset of the session's problem ids, built on first use once all its problems are interned."""
+        if self._problem_mask is None:
+            self._problem_mask = mask(PROBLEMS.intern(problem) for problem in self.problems)
+        return self._problem_mask
+
+    @property
+    def results(self) -> ResultTable:
+        if self._result_dicts is not None:
+            # parsed on first use, see from_dict
+            self._results = ResultTable.from_dicts(self._result_dicts)
+            self._result_dicts = None
+        return self._results
+
+    @results.setter
+    def results(self, results: ResultTable):
+        self._results = results
+        self._result_dicts = None
 
     @staticmethod
     def get_emtpy_model() -> Session:
@@ -38,23 +64,39 @@ class Session:
             starttime='',
             length='',
             problems=set(),
-            results=[]
+            results=ResultTable()
         )
 
     @staticmethod
     def _is_upsolve_session(session_name: str):
         return 'upsolve' in session_name.lower()
 
+    @classmethod
+    @profiled
+    def from_dict(cls, session_dict: dict, parse_results: bool = True) -> Session:
+        """:param parse_results: if False, the results are only parsed from the dict when they are first used"""
+        session = cls.get_emtpy_model()
+        session.name = session_dict['name']
+        for key in session_dict['problems']:
+            # share the interned name so every session and result refers to a single string per problem
+            problem_name = session_dict['problems'][key]['problem_name']
+            session.problems.add(PROBLEMS.name(PROBLEMS.intern(problem_name)))
+        session.length = session_dict['length']
+        session.starttime = session_dict['starttime']
+        if parse_results:
+            session.results = ResultTable.from_dicts(session_dict['results'])
+        else:
+            session._result_dicts = session_dict['results']
+        session.is_upsolve = Session._is_upsolve_session(session_dict['name'])
+        return session
+
+    @staticmethod
+    def iter_kattis_sessions(session_dicts: Iterable[dict]) -> Iterator[Session]:
+        """Lazily builds a Session for each session dict, so the dicts can be streamed from the dump."""
+        for session_dict in session_dicts:
+            yield Session.from_dict(session_dict)
+
     @staticmethod
+    @profiled
     def parse_kattis_sessions(kattis_json) -> List[Session]:
-        sessions: List[Session] = [Session.get_emtpy_model() for _ in kattis_json['sessions']]
-        for i, session in enumerate(kattis_json['sessions']):
-            sessions[i].name = session['name']
-            for key in session['problems']:
-                sessions[i].problems.add(session['problems'][key]['problem_name'])
-            sessions[i].length = session['length']
-            sessions[i].starttime = session['starttime']
-            sessions[i].results = [Result.from_dict(res_dict) for res_dict in session['results']]
-            sessions[i].is_upsolve = Session._is_upsolve_session(session['name'])
-
-        return sessions
+        return list(Session.iter_kattis_sessions(kattis_json['sessions']))
@@ -1,14 +1,17 @@
 from __future__ import annotations
 
-from collections import defaultdict
-from typing import List, Dict
+from typing import Dict, Iterable, List
 import logging as log
-import pandas as pd
 
+from models.Problems import ProblemScores, SOLVES
 from models.Session import Session
+from util.Profiling import profiled
 
 
 class Student:
+    __slots__ = ('kattis_username', 'canvas_name', 'name', 'hidden', 'email', 'problems_solved', 'honors',
+                 'canvas_index')
+
     # "username": "kattis-user", "name": "Kattis User", "non_anonymous": "t", "email": "kattisuser@tamu.edu"
     def __init__(self, kattis_username: str, name: str, visible_name: str, email: str):
         self.kattis_username = kattis_username
@@ -17,48 +20,58 @@ class Student:
         self.hidden = False if visible_name == 'f' else True
         self.email = email
         # problem id -> points earned (0, .5 or 1 in theory)...
-        self.problems_solved: defaultdict = defaultdict(float)
+        # backed by this student's row in the shared SolveTable
+        self.problems_solved: ProblemScores = ProblemScores(SOLVES.add_row())
         self.honors: bool = False
         self.canvas_index: int = -1
 
     @staticmethod
+    def from_dict(student_json: dict) -> Student:
+        return Student(
+            name=student_json['name'],
+            kattis_username=student_json['username'],
+            email=student_json['email'],
+            visible_name=student_json['non_anonymous']
+        )
+
+    @staticmethod
+    @profiled
     def parse_kattis_students(kattis_json) -> List[Student]:
-        students_json = kattis_json['students']
-        students: List[Student] = []
-        for student_json in students_json:
-            students.append(
-                Student(
-                    name=student_json['name'],
-                    kattis_username=student_json['username'],
-                    email=student_json['email'],
-                    visible_name=student_json['non_anonymous']
-                )
-            )
-        return students
+        return [Student.from_dict(student_json) for student_json in kattis_json['students']]
 
     @staticmethod
-    def populate_problems_solved_from_sessions(students: Dict[str, Student], sessions: List[Session]):
+    @profiled
+    def populate_problems_solved_from_sessions(students: Dict[str, Student], sessions: Iterable[Session]):
+        """
+        Computes each student's problems_solved from the results of every session.
+        :param students: kattis username -> student
+        :param sessions: any iterable of sessions, including a generator streaming them from the dump
+        """
         for session in sessions:
-            for result in session.results:
+            for members, problem_ids in session.results.members_and_problems():
                 # handles individuals and teams
-                for member in result.members:
-                    for problem in result.problems:
+                for member in members:
+                    problems_solved = students[member].problems_solved
+                    for problem_id in problem_ids:
                         # ensure we only count each problem once
-                        students[member].problems_solved[problem] = max(
-                            students[member].problems_solved[problem],
-                            0.5 if session.is_upsolve else 1
-                        )
+                        problems_solved.raise_score(problem_id, 0.5 if session.is_upsolve else 1)
 
     @staticmethod
-    def set_canvas_row_indices(students: Dict[str, Student], canvas_df: pd.DataFrame):
+    @profiled
+    def set_canvas_row_indices(students: Dict[str, Student], canvas_rows: Dict[str, int]):
+        missing: List[Student] = []
         for _, student in students.items():
+            # always reassigned, so a row from an earlier gradebook (e.g. in watch mode) is never graded again
+            student.canvas_index = -1
             if len(student.canvas_name) == 0:
                 continue
-            try:
-                student_index = canvas_df[canvas_df['Student'] == student.canvas_name].index[0]
-                student.canvas_index = student_index
-            except Exception as e:
-                log.warning(e)
-                log.warning(f"Note: Failed to find {student.name} from Kattis in Canvas as '{student.canvas_name}'. "
-                      f"This may happen when a student q-drops or changes name in Canvas. "
-                      f"If you want to fix this, delete cache/studentmap.data")
+            student_index = canvas_rows.get(student.canvas_name)
+            if student_index is None:
+                missing.append(student)
+                continue
+            student.canvas_index = student_index
+        if len(missing) > 0:
+            log.warning(f"Note: Failed to find {len(missing)} students from Kattis in Canvas: "
+                        + ", ".join(f"{student.name} as '{student.canvas_name}'" for student in missing))
+            log.warning("This may happen when a student q-drops or changes name in Canvas. "
+                        "Their cached matches will be redone on the next run.")
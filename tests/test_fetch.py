@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import main
+from util import Fetch
+
+EXPORT = b'{"students": [], "sessions": []}'
+ETAG = '"v1"'
+
+
+class ExportServer:
+    """A local HTTP server in a background thread that answers each path with a fixed route."""
+
+    def __init__(self, host: str = '127.0.0.1'):
+        # path -> (status, headers, body)
+        self.routes: Dict[str, tuple] = {}
+        # headers of every request received, in order
+        self.requests: List[Dict[str, str]] = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.requests.append(dict(self.headers.items()))
+                status, headers, body = server.routes.get(self.path, (404, {}, b''))
+                if status == 200 and 'ETag' in headers and self.headers.get('If-None-Match') == headers['ETag']:
+                    status, body = 304, b''
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.host = host
+        self.httpd = ThreadingHTTPServer((host, 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, path: str) -> str:
+        return f"http://{self.host}:{self.httpd.server_address[1]}{path}"
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FetchTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.server = ExportServer()
+        self.server.routes['/kattis.json'] = (200, {'ETag': ETAG}, EXPORT)
+        self.client = Fetch.HttpClient(Fetch.ConnectionPool())
+
+    def tearDown(self):
+        self.client.pool.close()
+        self.server.stop()
+        shutil.rmtree(self.folder)
+
+    def download(self, path: str, headers: Dict[str, str] = None) -> Fetch.Download:
+        return Fetch.Download(self.server.url(path), os.path.join(self.folder, 'kattis.json'), headers)
+
+    def test_download_writes_file_and_sidecar(self):
+        download = self.download('/kattis.json')
+        self.assertEqual(self.client.fetch(download), 'downloaded')
+        with open(download.path, "rb") as export_file:
+            self.assertEqual(export_file.read(), EXPORT)
+        self.assertEqual(download.read_sidecar()['etag'], ETAG)
+
+    def test_unchanged_export_is_not_downloaded_again(self):
+        download = self.download('/kattis.json')
+        self.client.fetch(download)
+        self.assertEqual(self.client.fetch(download), 'unchanged')
+        self.assertEqual(self.server.requests[-1].get('If-None-Match'), ETAG)
+        with open(download.path, "rb") as export_file:
+            self.assertEqual(export_file.read(), EXPORT)
+
+    def test_redirect_to_another_host_drops_authorization(self):
+        storage = ExportServer('localhost')
+        try:
+            storage.routes['/stored.json'] = (200, {}, EXPORT)
+            self.server.routes['/same_host'] = (302, {'Location': '/kattis.json'}, b'')
+            self.server.routes['/other_host'] = (302, {'Location': storage.url('/stored.json')}, b'')
+
+            self.client.fetch(self.download('/same_host', {'Authorization': 'Bearer secret'}))
+            self.assertEqual(self.server.requests[-1].get('Authorization'), 'Bearer secret')
+
+            download = self.download('/other_host', {'Authorization': 'Bearer secret'})
+            self.assertEqual(self.client.fetch(download), 'downloaded')
+            self.assertEqual(self.server.requests[-1].get('Authorization'), 'Bearer secret')
+            self.assertNotIn('Authorization', storage.requests[-1])
+        finally:
+            storage.stop()
+
+    def test_redirect_to_another_port_drops_credentials(self):
+        storage = ExportServer()
+        try:
+            storage.routes['/stored.json'] = (200, {}, EXPORT)
+            self.server.routes['/other_port'] = (302, {'Location': storage.url('/stored.json')}, b'')
+
+            download = self.download('/other_port', {'Authorization': 'Bearer secret', 'Cookie': 'session=secret',
+                                                     'Accept': 'application/json'})
+            self.assertEqual(self.client.fetch(download), 'downloaded')
+            self.assertEqual(self.server.requests[-1].get('Cookie'), 'session=secret')
+            self.assertNotIn('Authorization', storage.requests[-1])
+            self.assertNotIn('Cookie', storage.requests[-1])
+            self.assertEqual(storage.requests[-1].get('Accept'), 'application/json')
+        finally:
+            storage.stop()
+
+    def test_redirect_from_https_to_http_is_refused(self):
+        headers = {'Authorization': 'Bearer secret'}
+        self.assertEqual(Fetch.redirect_headers('https://canvas.test/a', 'https://canvas.test/b', headers), headers)
+        with self.assertRaises(Fetch.FetchError):
+            Fetch.redirect_headers('https://canvas.test/a', 'http://canvas.test/b', headers)
+
+    def test_failed_download_falls_back_to_previous_copy(self):
+        self.server.routes['/broken.json'] = (500, {}, b'')
+        download = self.download('/broken.json')
+        self.assertFalse(main.fetch_inputs([download]))
+
+        with open(download.path, "wb") as export_file:
+            export_file.write(EXPORT)
+        self.assertTrue(main.fetch_inputs([download]))
+        with open(download.path, "rb") as export_file:
+            self.assertEqual(export_file.read(), EXPORT)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from models.Student import Student
+from util import Caching, Input
+
+
+class NameMapTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_folder = tempfile.mkdtemp()
+        self.canvas_df = pd.DataFrame({
+            'Student': ['    Points Possible', 'Smith, John', 'Doe, Jane'],
+            'ID': [None, 1, 2],
+            'Section': [None, 'CSCE-120-500', 'CSCE-120-500']
+        })
+        self.students = {
+            'jsmith': Student('jsmith', 'John Smith', 'f', 'jsmith@example.com'),
+            # only a possible match, which is left for review
+            'jdoe': Student('jdoe', 'Janet Doe', 'f', 'jdoe@example.com')
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_folder)
+
+    def canvas_util(self) -> Input.CanvasUtil:
+        return Input.CanvasUtil(self.canvas_df.copy(), self.cache_folder, interactive=False, auto_accept_score=1.1)
+
+    def decide(self, decision: str):
+        path = os.path.join(self.cache_folder, 'match_review.csv')
+        with open(path, "r", newline='') as review_file:
+            rows = list(csv.DictReader(review_file))
+        for row in rows:
+            row['decision'] = decision
+        with open(path, "w", newline='') as review_file:
+            writer = csv.DictWriter(review_file, Caching.MatchReviewQueue.COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def test_later_runs_keep_the_map_in_memory(self):
+        canvas_util = self.canvas_util()
+        canvas_util.populate_canvas_names(self.students)
+        self.assertEqual(self.students['jsmith'].canvas_name, 'Smith, John')
+        self.assertEqual(self.students['jdoe'].canvas_name, '')
+
+        with mock.patch.object(Caching.CacheUtil, 'open_names_map_store') as open_store, \
+                mock.patch.object(Caching.MatchReviewQueue, 'read_decisions') as read_decisions, \
+                mock.patch.object(Caching.MatchReviewQueue, 'write') as write:
+            canvas_util.populate_canvas_names(self.students)
+        open_store.assert_not_called()
+        read_decisions.assert_not_called()
+        write.assert_not_called()
+        self.assertEqual(self.students['jsmith'].canvas_name, 'Smith, John')
+
+    def test_decisions_are_applied_on_the_next_run(self):
+        canvas_util = self.canvas_util()
+        canvas_util.populate_canvas_names(self.students)
+        self.decide('accept')
+        canvas_util.populate_canvas_names(self.students)
+        self.assertEqual(self.students['jdoe'].canvas_name, 'Doe, Jane')
+        self.assertFalse(os.path.exists(os.path.join(self.cache_folder, 'match_review.csv')))
+
+        # and saved, for runs that start from the store
+        self.students['jdoe'].canvas_name = ''
+        self.canvas_util().populate_canvas_names(self.students)
+        self.assertEqual(self.students['jdoe'].canvas_name, 'Doe, Jane')
+
+
+if __name__ == '__main__':
+    unittest.main()
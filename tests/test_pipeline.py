@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+from typing import Dict, List, Tuple
+
+import main
+from benchmarks.generate import generate
+from models.Problems import PROBLEMS, SOLVES
+from models.Result import USERNAMES
+from models.Session import Session
+from models.Student import Student
+from util import Input
+
+# the gradebook the original, unoptimized pipeline wrote for generate(40, 12, folder, seed=0) with
+# ps01problem0 and lab01problem0 as honors problems
+GRADED_GRADEBOOK = os.path.join(os.path.dirname(__file__), 'data', 'graded_40x12.csv')
+
+
+def _load_serial(kattis_path: str) -> Tuple[Dict[str, Student], List[Session]]:
+    student_dict, sessions = Input.load_kattis_info(kattis_path)
+    Student.populate_problems_solved_from_sessions(student_dict, sessions)
+    return student_dict, sessions
+
+
+def _load_parallel(kattis_path: str) -> Tuple[Dict[str, Student], List[Session]]:
+    return Input.load_kattis_info_parallel(kattis_path, 2)
+
+
+class PipelineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.kattis_path, cls.canvas_path = generate(40, 12, cls.folder, seed=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def setUp(self):
+        # every load interns into the shared tables, so each one starts from empty tables
+        PROBLEMS.reset()
+        USERNAMES.reset()
+        SOLVES.reset()
+        self.cache_folder = tempfile.mkdtemp()
+        with open(os.path.join(self.cache_folder, 'honors_problems.in'), 'w') as honors_file:
+            honors_file.write('ps01problem0\nlab01problem0\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_folder)
+
+    def scores(self, student_dict: Dict[str, Student]) -> Dict[str, Dict[str, float]]:
+        return {username: dict(student.problems_solved) for username, student in student_dict.items()}
+
+    def test_parallel_scores_match_serial(self):
+        serial = self.scores(_load_serial(self.kattis_path)[0])
+        self.setUp()
+        parallel = self.scores(_load_parallel(self.kattis_path)[0])
+        self.assertEqual(parallel, serial)
+        self.assertTrue(any(len(problems) > 0 for problems in serial.values()))
+
+    def test_grades_match_known_good_gradebook(self):
+        with open(GRADED_GRADEBOOK, "r") as gradebook_file:
+            expected = gradebook_file.read()
+        for load in (_load_serial, _load_parallel):
+            with self.subTest(load=load.__name__):
+                self.tearDown()
+                self.setUp()
+                student_dict, sessions = load(self.kattis_path)
+                canvas_util = Input.CanvasUtil(Input.load_canvas_info(self.canvas_path), self.cache_folder,
+                                               interactive=False)
+                main.match_and_grade(canvas_util, student_dict, sessions, self.cache_folder, main.HONORS_RULES,
+                                     incremental=False)
+                output_path = os.path.join(self.cache_folder, 'output.csv')
+                canvas_util.canvas_df.to_csv(output_path, index=False, quotechar='"')
+                with open(output_path, "r") as output_file:
+                    self.assertEqual(output_file.read(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
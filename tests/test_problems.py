@@ -0,0 +1,50 @@
+import pickle
+import unittest
+
+from models.Problems import SolveTable
+
+
+class SolveTableSerializationTest(unittest.TestCase):
+    def setUp(self):
+        self.table = SolveTable()
+        self.row = self.table.add_row()
+        # solved, up-solved, and up-solved then solved
+        for problem_id, score in [(0, 1), (3, 0.5), (70, 1), (71, 0.5), (5, 0.5), (5, 1)]:
+            self.table.raise_score(self.row, problem_id, score)
+
+    def scores(self, table: SolveTable, row: int):
+        return {problem_id: table.get(row, problem_id) for problem_id in range(table.stride)
+                if table.get(row, problem_id) > 0}
+
+    def test_round_trip(self):
+        data = self.table.to_bytes(self.row)
+        copy = SolveTable()
+        row = copy.add_row()
+        copy.load_bytes(row, data)
+        self.assertEqual(self.scores(copy, row), {0: 1, 3: 0.5, 5: 1, 70: 1, 71: 0.5})
+        self.assertEqual(copy.solved_bits[row], self.table.solved_bits[self.row])
+        self.assertEqual(copy.upsolved_bits[row], self.table.upsolved_bits[self.row])
+        self.assertEqual(copy.to_bytes(row), data)
+
+    def test_round_trip_into_other_problem_ids(self):
+        copy = SolveTable()
+        row = copy.add_row()
+        # problem id i of the saved row is problem id 100 - i here
+        copy.load_bytes(row, self.table.to_bytes(self.row), [100 - problem_id for problem_id in range(72)])
+        self.assertEqual(self.scores(copy, row), {100: 1, 97: 0.5, 95: 1, 30: 1, 29: 0.5})
+
+    def test_empty_row(self):
+        row = self.table.add_row()
+        copy = SolveTable()
+        copy_row = copy.add_row()
+        copy.load_bytes(copy_row, self.table.to_bytes(row))
+        self.assertEqual(self.scores(copy, copy_row), {})
+
+    def test_smaller_than_dict_of_floats(self):
+        problem_scores = {f"ps01problem{problem_id}": score
+                          for problem_id, score in self.scores(self.table, self.row).items()}
+        self.assertLess(len(self.table.to_bytes(self.row)) * 4, len(pickle.dumps(problem_scores)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from models.Result import Result, ResultTable
+
+RESULT_DICT = {
+    'team_name': 'team1',
+    'solved_count': 2,
+    'total_time': 95,
+    'members': ['alice', 'bob'],
+    'problems': [
+        {'problem_name': 'ps01problem0', 'solve_time': 30},
+        {'problem_name': 'ps01problem1'},
+        {'problem_name': 'ps01problem2', 'solve_time': 65}
+    ]
+}
+
+
+class ResultTest(unittest.TestCase):
+    def test_from_dict(self):
+        result = Result.from_dict(RESULT_DICT)
+        self.assertEqual(result.team_name, 'team1')
+        self.assertEqual(result.solved_count, 2)
+        self.assertEqual(result.total_time, 95)
+        self.assertEqual(result.members, ('alice', 'bob'))
+        self.assertEqual(result.problems, ['ps01problem0', 'ps01problem2'])
+        self.assertEqual(list(result.solve_times), [30, 65])
+
+    def test_from_dict_matches_table_row(self):
+        result = Result.from_dict(RESULT_DICT)
+        row = ResultTable.from_dicts([RESULT_DICT])[0]
+        self.assertEqual((result.team_name, result.members, result.problems),
+                         (row.team_name, row.members, row.problems))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import json
+import logging as log
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from util.Fetch import Download
+
+
+class BatchJob:
+    """One Kattis dump / Canvas gradebook pair to grade, as listed in a batch manifest."""
+
+    def __init__(self, kattis_json: str, canvas_csv: str, cache_folder: str, output_path: str, kattis_url: str = '',
+                 canvas_url: str = '', headers: Optional[Dict[str, Dict[str, str]]] = None):
+        """
+        :param kattis_url: if set, kattis_json is downloaded from here before grading (same for canvas_url)
+        :param headers: extra request headers for the 'kattis' and 'canvas' downloads, e.g. an Authorization header
+        """
+        self.kattis_json = kattis_json
+        self.canvas_csv = canvas_csv
+        self.cache_folder = cache_folder
+        self.output_path = output_path
+        self.kattis_url = kattis_url
+        self.canvas_url = canvas_url
+        self.headers = headers or {}
+
+    def downloads(self) -> List[Download]:
+        downloads = []
+        if len(self.kattis_url) > 0:
+            downloads.append(Download(self.kattis_url, self.kattis_json, self.headers.get('kattis')))
+        if len(self.canvas_url) > 0:
+            downloads.append(Download(self.canvas_url, self.canvas_csv, self.headers.get('canvas')))
+        return downloads
+
+    @property
+    def name(self) -> str:
+        return self.output_path
+
+    @classmethod
+    def from_dict(cls, job_dict: dict) -> 'BatchJob':
+        return BatchJob(
+            kattis_json=job_dict['kattis_json'],
+            canvas_csv=job_dict['canvas_csv'],
+            # jobs write their name map, review file, fingerprints and snapshot there, so they can't share one
+            cache_folder=job_dict.get('cache_folder') or f"{os.path.splitext(job_dict['output_path'])[0]}_cache",
+            output_path=job_dict['output_path'],
+            kattis_url=job_dict.get('kattis_url', ''),
+            canvas_url=job_dict.get('canvas_url', ''),
+            headers=job_dict.get('headers')
+        )
+
+
+def load_manifest(filepath: str) -> List[BatchJob]:
+    """
+    Reads a batch manifest: a JSON list of objects with the keys kattis_json, canvas_csv, output_path and
+    (optionally) cache_folder, kattis_url, canvas_url and headers. Relative paths are resolved against the manifest's
+    folder. Every job needs its own cache folder; without one, <output path without extension>_cache is used.
+    """
+    with open(filepath, "r") as manifest_file:
+        job_dicts = json.load(manifest_file)
+
+    base_folder = os.path.dirname(os.path.abspath(filepath))
+    jobs: List[BatchJob] = []
+    for job_dict in job_dicts:
+        job = BatchJob.from_dict(job_dict)
+        job.kattis_json = os.path.join(base_folder, job.kattis_json)
+        job.canvas_csv = os.path.join(base_folder, job.canvas_csv)
+        job.cache_folder = os.path.join(base_folder, job.cache_folder)
+        job.output_path = os.path.join(base_folder, job.output_path)
+        jobs.append(job)
+
+    outputs = [job.output_path for job in jobs]
+    if len(set(outputs)) != len(outputs):
+        raise ValueError(f"Batch manifest '{filepath}' lists the same output path more than once.")
+    cache_folders = [os.path.normpath(job.cache_folder) for job in jobs]
+    if len(set(cache_folders)) != len(cache_folders):
+        raise ValueError(f"Batch manifest '{filepath}' lists the same cache folder for more than one job.")
+    return jobs
+
+
+def run_batch(jobs: List[BatchJob], run_job: Callable[[BatchJob], Dict], workers: Optional[int] = None) -> List[Dict]:
+    """
+    Runs every job in a process pool.
+    :param jobs: jobs to run
+    :param run_job: picklable function (e.g. a module-level function, or a partial of one) that runs one job and
+        returns its summary
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :return: summaries in the same order as jobs
+    """
+    print(f"Running {len(jobs)} jobs...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        summaries = list(pool.map(run_job, jobs))
+    return summaries
+
+
+def print_summary(jobs: List[BatchJob], summaries: List[Dict]):
+    print("Batch summary:")
+    for job, summary in zip(jobs, summaries):
+        if 'error' in summary:
+            log.error(f"{job.name}: failed: {summary['error']}")
+            print(f"  {job.name}: FAILED ({summary['error']})")
+            continue
+        timings = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in summary['timings'].items())
+        print(f"  {job.name}: {summary['discrepancies']} discrepancies; {timings}")
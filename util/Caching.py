@@ -1,7 +1,143 @@
+import csv
+import os
 import pickle
+import sqlite3
 from collections import defaultdict
 import logging as log
-from typing import Optional, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from util.Profiling import profiled
+
+
+class NameMapStore:
+    """
+    On-disk Kattis -> Canvas student name map, keyed by Kattis username (and indexed by Kattis name).
+    Entries are upserted and invalidated individually instead of rewriting the whole map.
+    An empty canvas name records a student that is known to have no Canvas match.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS student_map ("
+                "kattis_username TEXT PRIMARY KEY, kattis_name TEXT NOT NULL, canvas_name TEXT NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS student_map_name ON student_map (kattis_name)")
+
+    def lookup(self, kattis_username: str) -> Optional[Tuple[str, str]]:
+        """:return: (kattis name, canvas name) for the username, or None if it isn't cached"""
+        return self.connection.execute(
+            "SELECT kattis_name, canvas_name FROM student_map WHERE kattis_username = ?", (kattis_username,)
+        ).fetchone()
+
+    def lookup_by_name(self, kattis_name: str) -> Optional[str]:
+        row = self.connection.execute(
+            "SELECT canvas_name FROM student_map WHERE kattis_name = ?", (kattis_name,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    @profiled
+    def load_all(self) -> Dict[str, Tuple[str, str]]:
+        """:return: kattis username -> (kattis name, canvas name) for every cached entry"""
+        return {
+            kattis_username: (kattis_name, canvas_name) for kattis_username, kattis_name, canvas_name in
+            self.connection.execute("SELECT kattis_username, kattis_name, canvas_name FROM student_map")
+        }
+
+    @profiled
+    def upsert_many(self, entries: Iterable[Tuple[str, str, str]]):
+        """:param entries: (kattis username, kattis name, canvas name) triples to insert or replace"""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO student_map (kattis_username, kattis_name, canvas_name) VALUES (?, ?, ?)",
+                entries
+            )
+
+    def invalidate(self, kattis_username: str):
+        with self.connection:
+            self.connection.execute("DELETE FROM student_map WHERE kattis_username = ?", (kattis_username,))
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM student_map").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+
+class MatchReviewQueue:
+    """
+    CSV file of uncertain Kattis -> Canvas matches left for a human to decide on outside of a run.
+    Each row is one candidate; filling in the decision column with 'accept' (or 'y') or 'reject' (or 'n') makes the
+    next run apply it. Rows left blank stay pending and are written again with that run's candidates.
+    """
+
+    COLUMNS = ['kattis_username', 'kattis_name', 'canvas_name', 'score', 'decision']
+    ACCEPT = {'accept', 'accepted', 'yes', 'y'}
+    REJECT = {'reject', 'rejected', 'no', 'n'}
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def read_decisions(self) -> Tuple[Dict[str, Tuple[str, str]], Dict[str, str]]:
+        """
+        :return: the accepted matches as kattis username -> (kattis name, canvas name), and the kattis usernames
+            whose every candidate was rejected -> kattis name
+        """
+        accepted: Dict[str, Tuple[str, str]] = {}
+        rejected: Dict[str, str] = {}
+        pending: Set[str] = set()
+        if not os.path.isfile(self.path):
+            return accepted, rejected
+        with open(self.path, "r", newline='') as review_file:
+            for row in csv.DictReader(review_file):
+                kattis_username = row.get('kattis_username') or ''
+                decision = (row.get('decision') or '').strip().lower()
+                if decision in self.ACCEPT:
+                    # the first accepted candidate wins if several were accepted
+                    accepted.setdefault(kattis_username, (row.get('kattis_name') or '', row.get('canvas_name') or ''))
+                elif decision in self.REJECT:
+                    rejected[kattis_username] = row.get('kattis_name') or ''
+                else:
+                    pending.add(kattis_username)
+        # a student is only known to have no match once all of their candidates were rejected
+        rejected = {kattis_username: kattis_name for kattis_username, kattis_name in rejected.items()
+                    if kattis_username not in accepted and kattis_username not in pending}
+        log.info(f"Read {len(accepted)} accepted and {len(rejected)} rejected matches from {self.path}.")
+        return accepted, rejected
+
+    def write(self, candidates: List[Tuple[str, str, str, float]], kattis_usernames: Iterable[str]):
+        """
+        Replaces the rows of the given students with this run's candidates. Rows of other students, e.g. of another
+        course graded with the same cache folder, are kept as they are.
+        :param candidates: (kattis username, kattis name, canvas name, score) rows
+        :param kattis_usernames: every student whose matches this run decided or queued
+        """
+        kattis_usernames = set(kattis_usernames)
+        kept: List[Dict[str, str]] = []
+        if os.path.isfile(self.path):
+            with open(self.path, "r", newline='') as review_file:
+                kept = [row for row in csv.DictReader(review_file)
+                        if (row.get('kattis_username') or '') not in kattis_usernames]
+        if len(candidates) == 0 and len(kept) == 0:
+            if os.path.isfile(self.path):
+                os.remove(self.path)
+            return
+        # written next to the file and moved over it, so a reader never sees half of it
+        partial_path = f"{self.path}.part"
+        with open(partial_path, "w", newline='') as review_file:
+            writer = csv.DictWriter(review_file, self.COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(kept)
+            writer.writerows(
+                dict(zip(self.COLUMNS, (kattis_username, kattis_name, canvas_name, f"{score:.3f}", '')))
+                for kattis_username, kattis_name, canvas_name, score in candidates
+            )
+        os.replace(partial_path, self.path)
+        if len(candidates) > 0:
+            print(f"Saved {len(candidates)} possible matches for review to {self.path}. Fill in the decision column "
+                  f"with accept or reject and they will be applied on the next run.")
 
 
 class CacheUtil:
@@ -9,6 +145,7 @@ class CacheUtil:
         self.cache_folder_path = cache_folder_path
 
     # noinspection PyBroadException
+    @profiled
     def load_names_map_from_pickle(self, filename: str) -> Optional[defaultdict[str]]:
         kattis_name_to_canvas_name: Optional[defaultdict[str]] = None
         try:
@@ -27,13 +164,38 @@ class CacheUtil:
 
         return kattis_name_to_canvas_name
 
-    def update_names_map_to_pickle(self, filename: str, kattis_name_to_canvas_name: defaultdict[str]):
-        ans = input("Save matches? [Y/n]")
+    def update_names_map_to_pickle(self, filename: str, kattis_name_to_canvas_name: defaultdict[str], confirm=True):
+        ans = input("Save matches? [Y/n]") if confirm else 'y'
         if ans.lower() == 'yes' or ans.lower() == 'y' or len(ans.strip()) == 0:
             with open(f"{self.cache_folder_path}/{filename}", "wb+") as file:
                 pickle.dump(kattis_name_to_canvas_name, file)
                 print(f"Saved selections! ({len(kattis_name_to_canvas_name)} items).")
 
+    def open_names_map_store(self, filename: str) -> NameMapStore:
+        store = NameMapStore(f"{self.cache_folder_path}/{filename}")
+        log.info(f"Opened Kattis->Canvas student name map at {store.path} with {len(store)} entries.")
+        return store
+
+    def open_match_review(self, filename: str) -> MatchReviewQueue:
+        return MatchReviewQueue(f"{self.cache_folder_path}/{filename}")
+
+    def update_names_map_store(self, store: NameMapStore, entries: Dict[str, Tuple[str, str]], confirm=True) -> bool:
+        """
+        Saves newly confirmed matches without touching the rest of the map.
+        :param entries: kattis username -> (kattis name, canvas name)
+        :return: whether the matches were saved
+        """
+        ans = input("Save matches? [Y/n]") if confirm else 'y'
+        if ans.lower() == 'yes' or ans.lower() == 'y' or len(ans.strip()) == 0:
+            store.upsert_many(
+                (kattis_username, kattis_name, canvas_name) for kattis_username, (kattis_name, canvas_name) in
+                entries.items()
+            )
+            print(f"Saved selections! ({len(entries)} items).")
+            return True
+        return False
+
+    @profiled
     def read_honors_skips(self, filename) -> Optional[Set[str]]:
         honors_skips: Optional[Set[str]] = None
 
@@ -0,0 +1,80 @@
+import logging as log
+from typing import Iterable, List
+
+import numpy
+import pandas as pd
+
+DISCREPANCY_COLUMNS = ['column', 'student', 'old', 'new']
+
+
+def changed_cells(original: pd.DataFrame, updated: pd.DataFrame) -> numpy.ndarray:
+    """
+    NaN-aware cell comparison of two frames with the same labels.
+    :return: boolean array that is True where the cells differ (two NaNs count as equal)
+    """
+    both_missing = original.isna().to_numpy() & updated.isna().to_numpy()
+    return (original.to_numpy() != updated.to_numpy()) & ~both_missing
+
+
+def find_discrepancies(original_df: pd.DataFrame, canvas_df: pd.DataFrame, columns: Iterable[str],
+                       rows: Iterable[int]) -> pd.DataFrame:
+    """
+    Compares the graded columns against the gradebook that was loaded, one whole column block at a time.
+    Columns that have no grades entered yet, and base columns, are not checked.
+    :param columns: problem set columns to compare
+    :param rows: row labels of the students that were graded
+    :return: one row per discrepancy with the column, student, old (canvas) value and new (computed) value
+    """
+    rows = list(dict.fromkeys(rows))
+    # Grades have not been entered in these columns yet, so we don't check for discrepancies
+    checked: List[str] = [
+        col for col in sorted(columns) if not (original_df[col].sum() == 0 or 'base' in col.lower())
+    ]
+    if len(rows) == 0 or len(checked) == 0:
+        return pd.DataFrame(columns=DISCREPANCY_COLUMNS)
+
+    old = original_df.loc[rows, checked]
+    new = canvas_df.loc[rows, checked]
+    # transposed so the discrepancies come out column by column
+    col_positions, row_positions = numpy.nonzero(changed_cells(old, new).T)
+    return pd.DataFrame({
+        'column': numpy.array(checked, dtype=object)[col_positions],
+        'student': canvas_df.loc[rows, 'Student'].to_numpy()[row_positions],
+        'old': old.to_numpy()[row_positions, col_positions],
+        'new': new.to_numpy()[row_positions, col_positions],
+    })
+
+
+def export_changes(original_df: pd.DataFrame, canvas_df: pd.DataFrame, columns: Iterable[str],
+                   id_columns: Iterable[str], filepath: str) -> int:
+    """
+    Writes a canvas-importable gradebook holding only the rows and grade columns that changed.
+    :param columns: grade columns that may have been updated
+    :param id_columns: columns canvas needs to identify each student; always kept
+    :return: number of students written
+    """
+    columns = sorted(columns)
+    changed = changed_cells(original_df[columns], canvas_df[columns]) if len(columns) > 0 \
+        else numpy.zeros((len(canvas_df.index), 0), dtype=bool)
+    changed_rows = changed.any(axis=1)
+    changed_columns = [col for col, is_changed in zip(columns, changed.any(axis=0)) if is_changed]
+    kept_ids = [col for col in id_columns if col in canvas_df.columns]
+    canvas_df.loc[changed_rows, kept_ids + changed_columns].to_csv(filepath, index=False, quotechar='"')
+    print(f"Saved {int(changed_rows.sum())} changed students and {len(changed_columns)} changed columns to {filepath}")
+    return int(changed_rows.sum())
+
+
+def log_discrepancies(discrepancies: pd.DataFrame):
+    if not log.getLogger().isEnabledFor(log.WARNING):
+        return
+    for col, student, old, new in discrepancies.itertuples(index=False):
+        log.warning(f"Discrepancy: {col}::{student} Canvas score of {old} but computed score is {new}")
+
+
+def write_discrepancies(discrepancies: pd.DataFrame, filepath: str):
+    """Writes the discrepancy table as JSON records if the path ends in .json, otherwise as CSV."""
+    if filepath.lower().endswith('.json'):
+        discrepancies.to_json(filepath, orient='records', indent=1)
+    else:
+        discrepancies.to_csv(filepath, index=False, quotechar='"')
+    print(f"Saved {len(discrepancies)} discrepancies to {filepath}")
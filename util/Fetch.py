@@ -0,0 +1,241 @@
+"""
+Downloads the Kattis exports and Canvas gradebooks of every course at once before grading.
+
+Downloads run concurrently on an asyncio event loop. Each one is a blocking http.client request run in a worker
+thread, and connections are kept alive and reused through a pool per host. Responses are streamed to disk. Each
+downloaded file gets a sidecar (<file>.http.json) with its ETag and Last-Modified, so an unchanged export is answered
+with 304 Not Modified and isn't downloaded again.
+"""
+import asyncio
+import http.client
+import json
+import logging as log
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+CHUNK_SIZE = 1 << 16
+MAX_REDIRECTS = 5
+TIMEOUT = 60
+# request headers that carry the user's credentials, and are only sent to the origin they were given for
+CREDENTIAL_HEADERS = {'authorization', 'cookie', 'proxy-authorization'}
+
+
+class FetchError(Exception):
+    pass
+
+
+class Download:
+    """A URL to keep a local copy of."""
+
+    def __init__(self, url: str, path: str, headers: Optional[Dict[str, str]] = None):
+        self.url = url
+        self.path = path
+        # environment variables in the values are expanded, so tokens don't have to be written into manifests
+        self.headers = {name: os.path.expandvars(value) for name, value in (headers or {}).items()}
+
+    @property
+    def sidecar_path(self) -> str:
+        return f"{self.path}.http.json"
+
+    def read_sidecar(self) -> Dict[str, str]:
+        """The validators saved with the last download, or nothing if the file or its sidecar is missing."""
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.sidecar_path, "r") as sidecar_file:
+                sidecar = json.load(sidecar_file)
+        except (OSError, ValueError):
+            return {}
+        # a sidecar left behind by a different URL says nothing about this one
+        return sidecar if sidecar.get('url') == self.url else {}
+
+    def write_sidecar(self, etag: Optional[str], last_modified: Optional[str]):
+        with open(self.sidecar_path, "w") as sidecar_file:
+            json.dump({'url': self.url, 'etag': etag, 'last_modified': last_modified}, sidecar_file, indent=1)
+
+
+class ConnectionPool:
+    """Idle keep-alive connections by (scheme, host, port), shared by the worker threads."""
+
+    def __init__(self, max_idle_per_host: int = 4):
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url: str) -> Tuple[str, str, int]:
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise FetchError(f"Unsupported URL '{url}'.")
+        return parts.scheme, parts.hostname or '', parts.port or (443 if parts.scheme == 'https' else 80)
+
+    def acquire(self, key: Tuple[str, str, int]) -> Tuple[http.client.HTTPConnection, bool]:
+        """:return: a connection to the host, and whether it was reused (and so may have been closed by the server)"""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self.connect(key), False
+
+    @staticmethod
+    def connect(key: Tuple[str, str, int]) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(host, port, timeout=TIMEOUT)
+
+    def release(self, key: Tuple[str, str, int], connection: http.client.HTTPConnection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for connection in idle:
+                    connection.close()
+            self._idle.clear()
+
+
+class HttpClient:
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    def _request(self, url: str, headers: Dict[str, str]) \
+            -> Tuple[http.client.HTTPResponse, Tuple[str, str, int], http.client.HTTPConnection]:
+        key = ConnectionPool.key(url)
+        parts = urlsplit(url)
+        target = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        connection, reused = self.pool.acquire(key)
+        try:
+            connection.request('GET', target, headers=headers)
+            return connection.getresponse(), key, connection
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            connection.close()
+            if not reused:
+                raise
+        except Exception:
+            connection.close()
+            raise
+        # the server closed the idle connection, so try once more on a new one
+        connection = ConnectionPool.connect(key)
+        try:
+            connection.request('GET', target, headers=headers)
+            return connection.getresponse(), key, connection
+        except Exception:
+            connection.close()
+            raise
+
+    def _finish(self, response: http.client.HTTPResponse, key: Tuple, connection: http.client.HTTPConnection):
+        # the connection can only be reused once its response has been read to the end
+        if response.isclosed() and not response.will_close:
+            self.pool.release(key, connection)
+        else:
+            connection.close()
+
+    def fetch(self, download: Download) -> str:
+        """
+        Brings the download's local file up to date.
+        :return: 'downloaded', or 'unchanged' if the server answered 304 Not Modified
+        """
+        sidecar = download.read_sidecar()
+        url = download.url
+        headers = dict(download.headers)
+        if sidecar.get('etag'):
+            headers['If-None-Match'] = sidecar['etag']
+        if sidecar.get('last_modified'):
+            headers['If-Modified-Since'] = sidecar['last_modified']
+
+        for _ in range(MAX_REDIRECTS + 1):
+            response, key, connection = self._request(url, headers)
+            if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                response.read()
+                self._finish(response, key, connection)
+                location = urljoin(url, response.getheader('Location'))
+                headers = redirect_headers(url, location, headers)
+                url = location
+                continue
+            if response.status == 304:
+                response.read()
+                self._finish(response, key, connection)
+                return 'unchanged'
+            if response.status != 200:
+                response.read()
+                self._finish(response, key, connection)
+                raise FetchError(f"GET {url} returned {response.status} {response.reason}.")
+            try:
+                self._save(response, download)
+            except Exception:
+                connection.close()
+                raise
+            self._finish(response, key, connection)
+            download.write_sidecar(response.getheader('ETag'), response.getheader('Last-Modified'))
+            return 'downloaded'
+        raise FetchError(f"Too many redirects for {download.url}.")
+
+    @staticmethod
+    def _save(response: http.client.HTTPResponse, download: Download):
+        folder = os.path.dirname(download.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # written next to the file and moved over it, so a failed download never leaves half an export behind
+        partial_path = f"{download.path}.part"
+        try:
+            with open(partial_path, "wb") as partial_file:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    partial_file.write(chunk)
+            os.replace(partial_path, download.path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+
+def redirect_headers(url: str, location: str, headers: Dict[str, str]) -> Dict[str, str]:
+    """
+    The request headers to follow a redirect from url to location with.
+    :raise FetchError: if the redirect goes from https to plain http
+    """
+    origin, target = ConnectionPool.key(url), ConnectionPool.key(location)
+    if origin[0] == 'https' and target[0] != 'https':
+        raise FetchError(f"Refusing to follow the redirect from {url} to {location}, which isn't encrypted.")
+    if target == origin:
+        return headers
+    # e.g. Canvas redirects file downloads to storage that must not see the API token or session cookies
+    return {name: value for name, value in headers.items() if name.lower() not in CREDENTIAL_HEADERS}
+
+
+async def fetch_all_async(downloads: List[Download], max_connections: int = 8) -> List[str]:
+    """
+    :return: for each download, 'downloaded', 'unchanged', or the error that stopped it
+    """
+    loop = asyncio.get_running_loop()
+    pool = ConnectionPool()
+    client = HttpClient(pool)
+    with ThreadPoolExecutor(max_workers=max_connections) as executor:
+        results = await asyncio.gather(
+            *(loop.run_in_executor(executor, client.fetch, download) for download in downloads),
+            return_exceptions=True
+        )
+    pool.close()
+    return [result if isinstance(result, str) else f"failed: {result}" for result in results]
+
+
+def fetch_all(downloads: List[Download], max_connections: int = 8) -> List[str]:
+    """Runs every download at once and prints what happened to each. See fetch_all_async."""
+    if len(downloads) == 0:
+        return []
+    print(f"Fetching {len(downloads)} exports...")
+    results = asyncio.run(fetch_all_async(downloads, max_connections))
+    for download, result in zip(downloads, results):
+        if result.startswith('failed'):
+            log.error(f"Could not fetch {download.url}: {result}")
+        print(f"  {download.path}: {result}")
+    return results
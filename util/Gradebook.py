@@ -0,0 +1,155 @@
+"""
+Lightweight gradebook backend built on the csv module, for quick runs that shouldn't pay for importing pandas.
+Cells are kept as the strings read from the export, so untouched cells are written back exactly as they were.
+"""
+import csv
+import json
+import logging as log
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from models.Problems import SOLVES
+from models.Session import Session
+
+
+class CsvGradebook:
+    """A Canvas gradebook stored column by column as lists of cell strings. Rows are labeled 0..n-1."""
+
+    def __init__(self, columns: List[str], data: Dict[str, List[str]], row_count: int):
+        self.columns = columns
+        self._data = data
+        self.index = range(row_count)
+
+    @classmethod
+    def read(cls, filepath: str, column_filter: Optional[Callable[[str], bool]] = None) -> 'CsvGradebook':
+        """
+        :param column_filter: only keep the columns it returns True for
+        """
+        # Excel saves exports with a byte order mark, which would otherwise end up in the first column's name
+        with open(filepath, "r", newline='', encoding='utf-8-sig') as csv_file:
+            reader = csv.reader(csv_file)
+            header = next(reader)
+            positions = [i for i, col in enumerate(header) if column_filter is None or column_filter(col)]
+            columns = [header[i] for i in positions]
+            data: Dict[str, List[str]] = {col: [] for col in columns}
+            cells = [data[col] for col in columns]
+            row_count = 0
+            for row in reader:
+                for position, column_cells in zip(positions, cells):
+                    column_cells.append(row[position] if position < len(row) else '')
+                row_count += 1
+        return cls(columns, data, row_count)
+
+    def __getitem__(self, column: str) -> List[str]:
+        return self._data[column]
+
+    def __setitem__(self, column: str, values: Sequence):
+        if column not in self._data:
+            self.columns.append(column)
+        self._data[column] = ['' if value is None else str(value) for value in values]
+
+    def count(self, column: str) -> int:
+        """Number of non-empty cells in the column."""
+        return sum(1 for cell in self._data[column] if len(cell.strip()) > 0)
+
+    def set_cells(self, column: str, rows: Iterable[int], values: Iterable):
+        cells = self._data[column]
+        for row, value in zip(rows, values):
+            cells[row] = str(value)
+
+    def copy(self) -> 'CsvGradebook':
+        return CsvGradebook(list(self.columns), {col: list(cells) for col, cells in self._data.items()},
+                            len(self.index))
+
+    def to_csv(self, filepath: str, columns: Optional[List[str]] = None, rows: Optional[Iterable[int]] = None):
+        columns = self.columns if columns is None else columns
+        cells = [self._data[col] for col in columns]
+        with open(filepath, "w", newline='', encoding='utf-8') as csv_file:
+            writer = csv.writer(csv_file, quotechar='"')
+            writer.writerow(columns)
+            for row in self.index if rows is None else rows:
+                writer.writerow([column_cells[row] for column_cells in cells])
+
+
+def column_counts(rows: List[int], sessions: Iterable[Session], is_upsolve: bool) -> List[int]:
+    """
+    Counts the distinct problems each SolveTable row solved (or up-solved) across the given sessions.
+    :param rows: the students' SolveTable rows
+    """
+    problem_mask = 0
+    for session in sessions:
+        problem_mask |= session.problem_mask
+    score = 0.5 if is_upsolve else 1
+    return [SOLVES.count(row, problem_mask, score) for row in rows]
+
+
+def _number(cell: str) -> Optional[float]:
+    """A cell's numeric value, None if it is empty, or NaN if it isn't a number."""
+    if len(cell.strip()) == 0:
+        return None
+    try:
+        return float(cell)
+    except ValueError:
+        return float('nan')
+
+
+def _differs(old: str, new: str) -> bool:
+    old_number, new_number = _number(old), _number(new)
+    if old_number is None or new_number is None:
+        return (old_number is None) != (new_number is None)
+    if old_number != old_number or new_number != new_number:
+        # at least one of them isn't a number
+        return old.strip() != new.strip()
+    return old_number != new_number
+
+
+def find_discrepancies(original: CsvGradebook, updated: CsvGradebook, columns: Iterable[str],
+                       rows: Iterable[int]) -> List[Tuple[str, str, str, str]]:
+    """Same as Diff.find_discrepancies, for CsvGradebooks: (column, student, old, new) for every changed cell."""
+    rows = list(dict.fromkeys(rows))
+    discrepancies = []
+    for col in sorted(columns):
+        column_sum = sum(number for number in map(_number, original[col]) if number is not None and number == number)
+        if column_sum == 0 or 'base' in col.lower():
+            # Grades have not been entered in this column yet, so we don't check for discrepancies
+            continue
+        old_cells, new_cells = original[col], updated[col]
+        discrepancies.extend(
+            (col, updated['Student'][row], old_cells[row], new_cells[row]) for row in rows
+            if _differs(old_cells[row], new_cells[row])
+        )
+    return discrepancies
+
+
+def write_discrepancies(discrepancies: List[Tuple[str, str, str, str]], filepath: str):
+    """Writes the discrepancies as JSON records if the path ends in .json, otherwise as CSV."""
+    columns = ['column', 'student', 'old', 'new']
+    if filepath.lower().endswith('.json'):
+        with open(filepath, "w") as json_file:
+            json.dump([dict(zip(columns, discrepancy)) for discrepancy in discrepancies], json_file, indent=1)
+    else:
+        with open(filepath, "w", newline='', encoding='utf-8') as csv_file:
+            writer = csv.writer(csv_file, quotechar='"')
+            writer.writerow(columns)
+            writer.writerows(discrepancies)
+    print(f"Saved {len(discrepancies)} discrepancies to {filepath}")
+
+
+def log_discrepancies(discrepancies: List[Tuple[str, str, str, str]]):
+    for col, student, old, new in discrepancies:
+        log.warning(f"Discrepancy: {col}::{student} Canvas score of {old} but computed score is {new}")
+
+
+def export_changes(original: CsvGradebook, updated: CsvGradebook, columns: Iterable[str],
+                   id_columns: Iterable[str], filepath: str) -> int:
+    """Same as Diff.export_changes, for CsvGradebooks."""
+    changed_rows = set()
+    changed_columns = []
+    for col in sorted(columns):
+        rows = [row for row in updated.index if _differs(original[col][row], updated[col][row])]
+        if len(rows) > 0:
+            changed_columns.append(col)
+            changed_rows.update(rows)
+    kept_ids = [col for col in id_columns if col in updated.columns]
+    updated.to_csv(filepath, kept_ids + changed_columns, sorted(changed_rows))
+    print(f"Saved {len(changed_rows)} changed students and {len(changed_columns)} changed columns to {filepath}")
+    return len(changed_rows)
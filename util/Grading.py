@@ -0,0 +1,63 @@
+from typing import Dict, List, Iterable
+
+import numpy
+
+from models.Problems import PROBLEMS, SOLVES
+from models.Session import Session
+from models.Student import Student
+from util.Profiling import profiled
+
+SOLVE_SCORE = 1.0
+UPSOLVE_SCORE = 0.5
+
+
+class GradeEngine:
+    """
+    Computes the per-column problem counts for every student at once.
+
+    The engine builds a student x problem score matrix from the students' rows of the SolveTable and a
+    session x problem membership mask, so a column's counts are a single matrix-vector product instead
+    of a loop over students, sessions and problems.
+    """
+
+    @profiled
+    def __init__(self, students: List[Student], sessions: List[Session]):
+        self.students = students
+        self.sessions = sessions
+
+        problem_names = set()
+        for session in sessions:
+            problem_names.update(session.problems)
+        self.problem_index: Dict[str, int] = {name: i for i, name in enumerate(sorted(problem_names))}
+        self.session_index: Dict[int, int] = {id(session): i for i, session in enumerate(sessions)}
+
+        # session x problem membership
+        self.session_mask = numpy.zeros((len(sessions), len(self.problem_index)), dtype=bool)
+        for i, session in enumerate(sessions):
+            self.session_mask[i, [self.problem_index[problem] for problem in session.problems]] = True
+
+        # student x problem scores in half points, sliced out of the shared SolveTable
+        problem_ids = [PROBLEMS.intern(name) for name in self.problem_index]
+        known = [(j, problem_id) for j, problem_id in enumerate(problem_ids) if problem_id < SOLVES.stride]
+        half_points = numpy.zeros((len(students), len(self.problem_index)), dtype=numpy.uint8)
+        if len(students) > 0 and len(known) > 0:
+            rows = [student.problems_solved.row for student in students]
+            columns, table_columns = zip(*known)
+            table = numpy.frombuffer(SOLVES.data, dtype=numpy.uint8).reshape(SOLVES.rows, SOLVES.stride)
+            half_points[:, list(columns)] = table[numpy.ix_(rows, list(table_columns))]
+            # release the view so the table's array can grow again
+            del table
+        self.solved = (half_points == SOLVE_SCORE * 2).astype(numpy.int32)
+        self.upsolved = (half_points == UPSOLVE_SCORE * 2).astype(numpy.int32)
+
+    def column_counts(self, sessions: Iterable[Session], is_upsolve: bool) -> numpy.ndarray:
+        """
+        Counts the distinct problems each student solved (or up-solved) across the given sessions.
+        :param sessions: the kattis sessions that count towards a single canvas column
+        :param is_upsolve: whether the column counts up-solves instead of solves
+        :return: vector of counts aligned with self.students
+        """
+        rows = [self.session_index[id(session)] for session in sessions]
+        problems = self.session_mask[rows].any(axis=0)
+        solves = self.upsolved if is_upsolve else self.solved
+        return solves @ problems.astype(numpy.int32)
@@ -0,0 +1,76 @@
+import logging as log
+import os
+import re
+from typing import Dict, Iterable, List, Set, Tuple, Union, TYPE_CHECKING
+
+from models.Problems import PROBLEMS, SOLVES, mask
+from models.Student import Student
+from util import Caching
+from util.Gradebook import CsvGradebook
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# students in a section matching the pattern don't get points for the problems listed in the file (in the cache folder)
+DEFAULT_HONORS_RULES: List[Tuple[str, str]] = [('2\\d{2}', 'honors_problems.in')]
+
+
+class HonorsRules:
+    """
+    Marks honors students from the gradebook's Section column and takes away their points for the honors-excluded
+    problems. Each rule is a (section regex, problems file) pair.
+    """
+
+    def __init__(self, rules: Iterable[Tuple[str, str]], cache_folder: str):
+        self.rules: List[Tuple[str, str]] = list(rules)
+        self.cache_folder = cache_folder
+        # problems file -> problems, read once per run
+        self._problems: Dict[str, Set[str]] = {}
+        # section regex -> students in a matching section
+        self.honors_students: Dict[str, List[Student]] = {}
+
+    def missing_files(self) -> List[str]:
+        """The rules' problems files that aren't in the cache folder."""
+        return [filename for _, filename in self.rules
+                if not os.path.isfile(os.path.join(self.cache_folder, filename))]
+
+    def problems(self, filename: str) -> Set[str]:
+        if filename not in self._problems:
+            cache_util = Caching.CacheUtil(self.cache_folder)
+            self._problems[filename] = cache_util.read_honors_skips(filename) or set()
+        return self._problems[filename]
+
+    def fingerprint(self) -> List[Tuple[str, List[str]]]:
+        """Every rule's pattern with its problems, for detecting changes between runs."""
+        return [(pattern, sorted(self.problems(filename))) for pattern, filename in self.rules]
+
+    def mark_students(self, students: Dict[str, Student], canvas_df: Union['pd.DataFrame', CsvGradebook],
+                      student_rows: Dict[str, int]):
+        """Sets student.honors for every student whose canvas row is in a section matching one of the rules."""
+        if 'Section' not in canvas_df.columns:
+            return
+        lightweight = isinstance(canvas_df, CsvGradebook)
+        sections = canvas_df['Section'] if lightweight else canvas_df['Section'].fillna('').astype(str)
+        for pattern, _ in self.rules:
+            if lightweight:
+                regex = re.compile(pattern)
+                honors_rows = {row for row, section in zip(canvas_df.index, sections) if regex.search(section)}
+            else:
+                honors_rows = set(canvas_df.index[sections.str.contains(pattern, regex=True).to_numpy()])
+            self.honors_students[pattern] = [
+                student for student in students.values() if student_rows.get(student.canvas_name) in honors_rows
+            ]
+            for student in self.honors_students[pattern]:
+                student.honors = True
+                log.info(f"Set {student.name} to honors.")
+
+    def clear_points(self):
+        """Zeroes the honors students' scores for their excluded problems in the shared SolveTable."""
+        for pattern, filename in self.rules:
+            # problems nobody was ever given points for aren't interned
+            problem_mask = mask(problem_id for problem_id in map(PROBLEMS.get, self.problems(filename))
+                                if problem_id is not None)
+            if problem_mask == 0:
+                continue
+            for student in self.honors_students.get(pattern, []):
+                SOLVES.clear_mask(student.problems_solved.row, problem_mask)
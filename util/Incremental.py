@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging as log
+from typing import Dict, Iterable, List, Set
+
+from models.Session import Session
+from models.Student import Student
+from util.Gradebook import CsvGradebook
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def session_fingerprint(session: Session) -> str:
+    """Hash of everything a session contributes to grading: its name, problems and results."""
+    results = sorted(
+        (result.team_name, sorted(result.members), sorted(result.problems)) for result in session.results
+    )
+    return _digest(session.name, session.is_upsolve, sorted(session.problems), results)
+
+
+class IncrementalGrader:
+    """
+    Skips regrading gradebook columns whose inputs haven't changed since the last run.
+
+    A column's fingerprint covers its current values in the gradebook, every session that shares a problem with
+    the sessions mapped to it (those decide the students' solve scores), the roster rows and the honors rules.
+    Fingerprints and the graded values are stored in the cache folder after each run.
+    """
+
+    def __init__(self, cache_folder: str, filename: str = 'fingerprints.json'):
+        self.path = f"{cache_folder}/{filename}"
+        self.previous: Dict = self._load()
+        self.session_fingerprints: Dict[str, str] = {}
+        self.column_fingerprints: Dict[str, str] = {}
+        self.stale_columns: Set[str] = set()
+        self.reused_columns: Set[str] = set()
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.path, "r") as file:
+                previous = json.load(file)
+                log.info(f"Loaded fingerprints for {len(previous.get('columns', {}))} columns from the last run.")
+                return previous
+        except FileNotFoundError:
+            log.info("No fingerprints from a previous run found; grading every column.")
+        except Exception as e:
+            log.warning(f"Unable to read fingerprints at {self.path}, grading every column: {e}")
+        return {}
+
+    def plan(self, canvas_df, columns: Iterable[str], student_dict: Dict[str, Student], sessions: List[Session],
+             honors_rules: List) -> Set[str]:
+        """
+        Fingerprints the sessions and columns and works out which columns need to be regraded.
+        Must run before grading, while canvas_df still holds the gradebook's original values.
+        :param honors_rules: the honors rules and their problems, as given by HonorsRules.fingerprint()
+        :return: the columns that have to be recomputed
+        """
+        # session names aren't unique (redos), so key them by position and name
+        fingerprints = [session_fingerprint(session) for session in sessions]
+        self.session_fingerprints = {
+            f"{i}:{session.name}": fingerprint for i, (session, fingerprint) in enumerate(zip(sessions, fingerprints))
+        }
+        sessions_by_problem: Dict[str, List[int]] = {}
+        for i, session in enumerate(sessions):
+            for problem in session.problems:
+                sessions_by_problem.setdefault(problem, []).append(i)
+
+        roster = sorted(
+            (student.kattis_username, int(student.canvas_index), student.honors)
+            for student in student_dict.values() if student.canvas_index != -1
+        )
+        roster_fingerprint = _digest(roster, honors_rules, len(canvas_df.index))
+
+        previous_columns: Dict[str, str] = self.previous.get('columns', {})
+        previous_values: Dict[str, list] = self.previous.get('values', {})
+        self.stale_columns.clear()
+        self.reused_columns.clear()
+        column_problems: Dict[str, Set[str]] = {}
+        for session in sessions:
+            column_problems.setdefault(session.canvas_name, set()).update(session.problems)
+        for col in columns:
+            problems = column_problems.get(col, set())
+            dependencies = sorted({i for problem in problems for i in sessions_by_problem[problem]})
+            self.column_fingerprints[col] = _digest(
+                col,
+                list(canvas_df[col]),
+                sorted(problems),
+                [fingerprints[i] for i in dependencies],
+                roster_fingerprint
+            )
+            if previous_columns.get(col) == self.column_fingerprints[col] and col in previous_values:
+                self.reused_columns.add(col)
+            else:
+                self.stale_columns.add(col)
+
+        previous_sessions: Set[str] = set(self.previous.get('sessions', {}).values())
+        changed_sessions = [name for name, fp in self.session_fingerprints.items() if fp not in previous_sessions]
+        log.info(f"{len(changed_sessions)} sessions changed since the last run: {changed_sessions}")
+        return self.stale_columns
+
+    def apply_previous(self, canvas_df):
+        """Copies the last run's graded values into the columns that don't need to be regraded."""
+        previous_values: Dict[str, list] = self.previous.get('values', {})
+        for col in self.reused_columns:
+            if isinstance(canvas_df, CsvGradebook):
+                canvas_df[col] = previous_values[col]
+            else:
+                import numpy
+                canvas_df[col] = numpy.array(previous_values[col], dtype=canvas_df[col].dtype)
+
+    def save(self, canvas_df):
+        values = {
+            # numpy scalars become plain python values
+            col: [value.item() if hasattr(value, 'item') else value for value in canvas_df[col]]
+            for col in self.column_fingerprints
+        }
+        try:
+            with open(self.path, "w+") as file:
+                json.dump({'sessions': self.session_fingerprints, 'columns': self.column_fingerprints,
+                           'values': values}, file)
+        except Exception as e:
+            log.warning(f"Unable to save fingerprints to {self.path}: {e}")
+
+    def report(self):
+        print(f"Incremental grading: recomputed {len(self.stale_columns)} columns, "
+              f"reused {len(self.reused_columns)} from the last run.")
+        if len(self.reused_columns) > 0:
+            log.info(f"Skipped unchanged columns: {sorted(self.reused_columns)}")
@@ -1,14 +1,27 @@
 import json
 import os
 from collections import defaultdict
-from typing import Dict, List, Set, Optional
+from typing import Dict, List, Set, Optional, Tuple, Union, TYPE_CHECKING
 import logging as log
-import pandas as pd
 import re
 
+from models.Problems import PROBLEMS
+from models.Result import Result
 from models.Session import Session
 from models.Student import Student
-from util import Caching
+from util import Caching, Streaming
+from util.Gradebook import CsvGradebook, column_counts
+from util.Matching import NameMatcher
+from util.Profiling import PROFILER, profiled
+from util.Watch import file_signature
+
+# pandas (and numpy) are only imported when the DataFrame backend is used, see load_canvas_info
+if TYPE_CHECKING:
+    import pandas as pd
+
+BACKENDS = ['pandas', 'csv']
+# similarity (0-1) a possible match needs to be accepted without asking when running non-interactively
+AUTO_ACCEPT_SCORE = 0.9
 
 
 def get_filename(file_objective: str, sys_arg: str = '') -> str:
@@ -32,6 +45,7 @@ def get_filename(file_objective: str, sys_arg: str = '') -> str:
     return file
 
 
+@profiled
 def load_kattis_info(filepath='') -> [Dict[str, Student], List[Session]]:
     student_json_filepath = filepath if len(filepath) > 0 else get_filename("Kattis JSON Dump")
     print("Loading Kattis info...", end=' ')
@@ -58,10 +72,190 @@ def load_kattis_info(filepath='') -> [Dict[str, Student], List[Session]]:
     return [students, sessions]
 
 
-def load_canvas_info(filepath: str):
+@profiled
+def stream_kattis_info(filepath='') -> [Dict[str, Student], List[Session]]:
+    """
+    Streams the Kattis dump instead of loading the whole JSON tree. Students and sessions are decoded one at a
+    time and each Session is aggregated into its students' problems_solved as soon as it is parsed.
+    :param filepath: path to the Kattis JSON dump, prompts the user if empty
+    :return: students (with problems_solved populated) and sessions
+    """
+    student_json_filepath = filepath if len(filepath) > 0 else get_filename("Kattis JSON Dump")
+    print("Streaming Kattis info...", end=' ')
+    students: Dict[str, Student] = {}
+    sessions: List[Session] = []
+    # sessions whose members haven't been streamed yet (only if the dump lists sessions before students)
+    deferred: List[Session] = []
+
+    def session_stream(kattis_dump_file):
+        for key, item in Streaming.iter_object_arrays(kattis_dump_file, {'students', 'sessions'}):
+            if key == 'students':
+                student = Student.from_dict(item)
+                students[student.kattis_username] = student
+                continue
+            session = Session.from_dict(item)
+            sessions.append(session)
+            if all(member in students for member in session.results.usernames()):
+                yield session
+            else:
+                deferred.append(session)
+        yield from deferred
+
+    try:
+        with open(student_json_filepath, "r") as kattis_dump_file:
+            log.info(f"main::stream_kattis_info: Opened file at '{student_json_filepath}'; streaming JSON...")
+            Student.populate_problems_solved_from_sessions(students, session_stream(kattis_dump_file))
+    except FileNotFoundError as _:
+        log.error(f"File not found at {student_json_filepath}")
+        exit()
+    except Exception as _:
+        log.error("Failed to Parse Kattis JSON. Please ensure the path to the intended file was provided.")
+        exit()
+
+    print("Done!")
+    return [students, sessions]
+
+
+# the dump's sessions, inherited by forked workers so their shards don't have to be pickled
+_SHARD_SOURCE: List[dict] = []
+
+
+def _parse_session_shard(shard: Union[Tuple[int, int], List[dict]]) -> Dict[str, Dict[str, float]]:
+    """
+    Aggregates one shard of the dump's sessions in a worker process.
+    :param shard: (start, stop) into _SHARD_SOURCE, or the session dicts themselves where workers aren't forked
+    :return: kattis username -> problem name -> best score across the shard. Problem ids differ between processes,
+        so the partial table is keyed by name.
+    """
+    session_dicts = _SHARD_SOURCE[shard[0]:shard[1]] if isinstance(shard, tuple) else shard
+    partial: Dict[str, Dict[str, float]] = defaultdict(dict)
+    for session_dict in session_dicts:
+        score = 0.5 if Session._is_upsolve_session(session_dict['name']) else 1
+        for result_dict in session_dict['results']:
+            problems = [problem['problem_name'] for problem in Result.solved_problems(result_dict)]
+            for member in result_dict['members']:
+                scores = partial[member]
+                for problem in problems:
+                    if scores.get(problem, 0) < score:
+                        scores[problem] = score
+    return dict(partial)
+
+
+@profiled
+def load_kattis_info_parallel(filepath='', workers: Optional[int] = None) -> [Dict[str, Student], List[Session]]:
+    """
+    Like load_kattis_info, but the sessions' scores are aggregated in shards by a pool of worker processes and the
+    partial tables are merged here, keeping each student's best score, which gives the same scores as the serial
+    path. Each session's results are only parsed if they are used later on (e.g. by incremental grading).
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :return: students (with problems_solved populated) and sessions, in the dump's order
+    """
+    # imported here, so runs that parse serially don't pay for loading the process pool
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    global _SHARD_SOURCE
+    student_json_filepath = filepath if len(filepath) > 0 else get_filename("Kattis JSON Dump")
+    print("Loading Kattis info in parallel...", end=' ')
+    try:
+        with open(student_json_filepath, "r") as kattis_dump_file:
+            kattis_json = json.load(kattis_dump_file)
+    except FileNotFoundError as _:
+        log.error(f"File not found at {student_json_filepath}")
+        exit()
+    except Exception as _:
+        log.error(f"Failed to parse '{student_json_filepath}' as json.")
+        exit()
+
+    students: Dict[str, Student] = {student.kattis_username: student for student in
+                                    Student.parse_kattis_students(kattis_json)}
+    session_dicts: List[dict] = kattis_json['sessions']
+    sessions: List[Session] = [Session.from_dict(session_dict, parse_results=False) for session_dict in session_dicts]
+
+    workers = workers or os.cpu_count() or 1
+    # a few shards per worker evens out sessions of different sizes
+    shard_size = max(1, -(-len(session_dicts) // (workers * 4)))
+    bounds = [(start, min(start + shard_size, len(session_dicts)))
+              for start in range(0, len(session_dicts), shard_size)]
+    fork = 'fork' in multiprocessing.get_all_start_methods()
+    shards = bounds if fork else [session_dicts[start:stop] for start, stop in bounds]
+    _SHARD_SOURCE = session_dicts
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('fork') if fork else None) as pool:
+            for partial in pool.map(_parse_session_shard, shards):
+                for member, scores in partial.items():
+                    problems_solved = students[member].problems_solved
+                    for problem, score in scores.items():
+                        problems_solved.raise_score(PROBLEMS.intern(problem), score)
+    finally:
+        _SHARD_SOURCE = []
+    PROFILER.count('session_shards', len(shards))
+
+    print("Done!")
+    return [students, sessions]
+
+
+# columns canvas needs to identify a student when a gradebook is imported
+CANVAS_ID_COLUMNS = ['Student', 'ID', 'SIS User ID', 'SIS Login ID', 'Integration ID', 'Section']
+
+
+def is_pset_column(column_name: str) -> bool:
+    """Whether a gradebook column holds kattis problem set or lab scores"""
+    return len(re.findall('ps\\d{2}', column_name.lower())) > 0 or 'lab' in column_name.lower()
+
+
+def column_key(column_name: str) -> Optional[Tuple[str, str, str]]:
+    """Parses a gradebook column header like 'PS03 Upsolve (1234)' into ('PS', '03', 'Upsolve')"""
+    match = re.search('(PS|Lab)(\\d{2}) (Solve|Upsolve)', column_name)
+    return None if match is None else match.groups()
+
+
+def session_column_key(session: Session) -> Optional[Tuple[str, str, str]]:
+    """The column_key of the gradebook column a kattis session like 'CSCE 120 Problem Set - 03 Upsolve' counts for"""
+    parts = session.name.split('-')
+    numbers = re.findall('\\d{2}', parts[1]) if len(parts) > 1 else []
+    if len(numbers) == 0:
+        return None
+    is_pset = len(re.findall('problem set', session.name.lower())) > 0
+    return 'PS' if is_pset else 'Lab', numbers[0], 'Upsolve' if session.is_upsolve else 'Solve'
+
+
+def _read_selected_columns(filepath: str) -> 'pd.DataFrame':
+    import pandas as pd
+    header = pd.read_csv(filepath, nrows=0).columns
+    id_columns = [col for col in header if col in CANVAS_ID_COLUMNS]
+    pset_columns = [col for col in header if is_pset_column(col)]
+    id_dtypes = {col: str for col in id_columns}
+    try:
+        return pd.read_csv(filepath, usecols=id_columns + pset_columns,
+                           dtype={**id_dtypes, **{col: 'float64' for col in pset_columns}})
+    except ValueError:
+        # some grade column holds text (e.g. a 'Manual Posting' row), so let pandas infer those
+        log.info("Not every problem set column is numeric; inferring their types instead.")
+        return pd.read_csv(filepath, usecols=id_columns + pset_columns, dtype=id_dtypes)
+
+
+def _is_selected_column(column_name: str) -> bool:
+    return column_name in CANVAS_ID_COLUMNS or is_pset_column(column_name)
+
+
+def load_canvas_info(filepath: str, selective=False, backend='pandas') -> Union['pd.DataFrame', CsvGradebook]:
+    """
+    Reads the canvas gradebook export.
+    :param selective: only read the student id columns (as text) and the problem set columns (as numbers),
+    which is much faster and lighter on gradebooks with many other assignments
+    :param backend: 'pandas' for a DataFrame, or 'csv' for a CsvGradebook, which doesn't need pandas or numpy
+    """
     print("Loading Canvas Grade Book...", end=' ')
     try:
-        canvas_df = pd.read_csv(filepath)
+        if backend == 'csv':
+            canvas_df = CsvGradebook.read(filepath, _is_selected_column if selective else None)
+        elif selective:
+            canvas_df = _read_selected_columns(filepath)
+        else:
+            import pandas as pd
+            canvas_df = pd.read_csv(filepath)
     except FileNotFoundError as _:
         log.error(f"No file found at '{filepath}'")
         exit()
@@ -78,127 +272,271 @@ def load_canvas_info(filepath: str):
 
 class CanvasUtil:
 
-    def __init__(self, canvas_df: pd.DataFrame, cache_folder='cache'):
+    def __init__(self, canvas_df: Union['pd.DataFrame', CsvGradebook], cache_folder='cache', interactive=True,
+                 auto_accept_score: float = AUTO_ACCEPT_SCORE):
         self.canvas_df = canvas_df
         self.cache_folder = cache_folder
-        self.canvas_pset_names: Set[str] = set(
-            filter(
-                lambda name: len(re.findall('ps\\d{2}', name.lower())) > 0 or 'lab' in name.lower(),
-                self.canvas_df.columns
-            )
-        )
+        # when False, never prompt: uncertain matches scoring at least auto_accept_score are accepted, the rest are
+        # written to the review file, and cache updates are saved automatically
+        self.interactive = interactive
+        self.auto_accept_score = auto_accept_score
+        # (kattis username, kattis name, canvas name, score) for the matches left for review this run
+        self.review_candidates: List[Tuple[str, str, str, float]] = []
+        self.canvas_pset_names: Set[str] = set(filter(is_pset_column, self.canvas_df.columns))
+        # canvas name -> row index / section, built once so per-student lookups don't filter the whole frame
+        self.student_rows: Dict[str, int] = {}
+        self.student_sections: Dict[str, str] = {}
+        self._build_student_index()
+        self._name_matcher: Optional[NameMatcher] = None
+        # canvas column -> kattis sessions that count towards it, filled in by populate_canvas_session_names
+        self.column_sessions: Dict[str, List[Session]] = {}
+        # kattis username -> (kattis name, canvas name), read from the name map store by the first
+        # populate_canvas_names and kept up to date after that, so later runs (see main.watch) don't read it again
+        self.names_map: Optional[Dict[str, Tuple[str, str]]] = None
+        # (signature, candidates, kattis usernames) of the review file populate_canvas_names last wrote
+        self._review_written: Optional[tuple] = None
+
+    @profiled
+    def _build_student_index(self):
+        duplicates: Set[str] = set()
+        sections = self.canvas_df['Section'] if 'Section' in self.canvas_df.columns \
+            else [''] * len(self.canvas_df.index)
+        for row_index, name, section in zip(self.canvas_df.index, self.canvas_df['Student'], sections):
+            if not isinstance(name, str):
+                continue
+            if name in self.student_rows:
+                duplicates.add(name)
+                continue
+            self.student_rows[name] = row_index
+            self.student_sections[name] = section if isinstance(section, str) else ''
+        if len(duplicates) > 0:
+            log.warning(f"Found {len(duplicates)} duplicate student names in Canvas; using the first row for each: "
+                        f"{sorted(duplicates)}")
+
+    @property
+    def name_matcher(self) -> NameMatcher:
+        # only needed when names aren't cached, so it's built on first use
+        if self._name_matcher is None:
+            self._name_matcher = NameMatcher(list(self.canvas_df['Student'])[1:])
+        return self._name_matcher
+
+    def _confirm_match(self, kattis_name: str, kattis_username: str, canvas_name: str) -> bool:
+        ans = input(f"Possible match: {kattis_name} ({kattis_username})={canvas_name}. Accept? [y/N]:")
+        return ans.lower() == 'yes' or ans.lower() == 'y'
 
     def _kattis_name_to_canvas_name(self, student: Student) -> str:
-        """Takes student name from kattis dump and returns the name from canvas"""
-        kattis_name = student.name.lower().strip()
-        kattis_username = student.name
-
-        if '(' in kattis_name:
-            kattis_name = kattis_name.split("(")[1].split(')')[0] + " " + kattis_name.split(" ")[-1]
-        if len(kattis_name.split(" ")) > 2:
-            kattis_name = kattis_name.split()[0] + " " + kattis_name.split()[-1]
-
-        names = list(self.canvas_df['Student'])[1:]
-        name: str
-        for name in names:
-            last, first = name.strip().lower().split(", ")
-            kattis_format = " ".join([first.strip(), last.strip()])
-            if kattis_name in kattis_format:
-                return name
-        last_names = []
-        first_names = []
-        for name in names:
-            last, first = name.strip().lower().split(", ")
-            if 'terry' in kattis_name and last == 'terry':
-                print(kattis_name, first, last)
-            if last in kattis_name:
-                last_names.append(name)
-            if first in kattis_name:
-                first_names.append(name)
-
-        # if no direct match, but only one student with that last name, return it
-        if len(last_names) <= 2:
-            for last_name in last_names:
-                ans = input(f"Possible match: {kattis_name} ({kattis_username})={last_name}. Accept? [y/N]:")
-                if ans.lower() == 'yes' or ans.lower() == 'y':
-                    return last_name
-
-        if len(first_names) == 1:
-            ans = input(f"Possible match: {kattis_name} ({kattis_username})={first_names[0]}. Accept? [y/N]:")
-            if ans.lower() == 'yes' or ans.lower() == 'y':
-                return first_names[0]
+        """
+        Takes student name from kattis dump and returns the name from canvas.
+        When not interactive, the best possible match is accepted if its score reaches auto_accept_score; otherwise
+        the possible matches are queued in review_candidates and '' is returned.
+        """
+        kattis_name = NameMatcher.normalize_kattis_name(student.name)
+        kattis_username = student.kattis_username
+
+        direct_match = self.name_matcher.direct_match(kattis_name)
+        if direct_match is not None:
+            return direct_match
+
+        possible_matches: List[Tuple[str, float]] = []
+        # if no direct match, but only one or two students with that last name, they're possible matches
+        possible_matches.extend(self.name_matcher.last_name_matches(kattis_name, max_matches=2))
+        first_names = self.name_matcher.first_name_matches(kattis_name, max_matches=1)
+        if len(first_names) == 1 and first_names[0][0] not in dict(possible_matches):
+            possible_matches.append(first_names[0])
+
+        if self.interactive:
+            for canvas_name, _ in possible_matches:
+                if self._confirm_match(kattis_name, kattis_username, canvas_name):
+                    return canvas_name
+        elif len(possible_matches) > 0:
+            canvas_name, score = max(possible_matches, key=lambda match: match[1])
+            if score >= self.auto_accept_score:
+                log.info(f"Auto-accepted match {kattis_name} ({kattis_username})={canvas_name} ({score:.3f}).")
+                return canvas_name
+            log.warning(f"Queued possible matches for {kattis_name} ({kattis_username}) for review.")
+            self.review_candidates.extend(
+                (kattis_username, student.name, canvas_name, score) for canvas_name, score in possible_matches
+            )
+            return ''
 
         print(f"Could not find canvas entry for kattis student: {kattis_name}")
         return ''
 
+    @profiled
     def populate_canvas_names(self, students: Dict[str, Student]):
         cache_util = Caching.CacheUtil(self.cache_folder)
-        kattis_name_canvas_name_map: Optional[defaultdict] = cache_util.load_names_map_from_pickle('studentmap.data')
-
-        if not kattis_name_canvas_name_map:
-            kattis_name_canvas_name_map = defaultdict(str)
-            for kattis_username, student in students.items():
-                canvas_name = self._kattis_name_to_canvas_name(student)
-                students[kattis_username].canvas_name = canvas_name
-                if len(canvas_name) > 0:
-                    kattis_name_canvas_name_map[student.name] = canvas_name
-            cache_util.update_names_map_to_pickle('studentmap.data', kattis_name_canvas_name_map)
-        else:
-            for kattis_name_key, canvas_name_value in kattis_name_canvas_name_map.items():
-                for _, student in students.items():
-                    if student.name == kattis_name_key:
-                        student.canvas_name = canvas_name_value
-                        log.info(f"Matched {student.name} to {canvas_name_value} from cache.")
-            for _, student in students.items():
-                if len(student.canvas_name) == 0:
-                    log.warning(
-                        f"No canvas name found for {student.name} with kattis username {student.kattis_username}")
+        # only opened to load the map the first time and to save changes to it
+        store: Optional[Caching.NameMapStore] = None
+        if self.names_map is None:
+            store = cache_util.open_names_map_store('studentmap.db')
+            self.names_map = store.load_all()
+            if len(self.names_map) == 0:
+                # carry over matches from the old pickle cache, which was keyed by kattis name
+                legacy_map: Optional[defaultdict] = cache_util.load_names_map_from_pickle('studentmap.data')
+                if legacy_map:
+                    self.names_map = {
+                        kattis_username: (student.name, legacy_map[student.name])
+                        for kattis_username, student in students.items() if student.name in legacy_map
+                    }
+                    store.upsert_many((kattis_username, name, canvas)
+                                      for kattis_username, (name, canvas) in self.names_map.items())
+                    log.info(f"Migrated {len(self.names_map)} entries from the studentmap.data cache.")
+        # kattis username -> (kattis name, canvas name)
+        cached: Dict[str, Tuple[str, str]] = self.names_map
+
+        # decisions made in the review file since the last run are applied in bulk; a file that is still the one
+        # this object wrote has none
+        review = cache_util.open_match_review('match_review.csv')
+        accepted, rejected = {}, {}
+        if self._review_written is None or file_signature(review.path) != self._review_written[0]:
+            accepted, rejected = review.read_decisions()
+        decided = {
+            kattis_username: entry for kattis_username, entry in accepted.items() if entry[1] in self.student_rows
+        }
+        if len(decided) < len(accepted):
+            log.warning(f"Ignored {len(accepted) - len(decided)} accepted matches to names no longer in Canvas.")
+        decided.update((kattis_username, (kattis_name, '')) for kattis_username, kattis_name in rejected.items())
+        if len(decided) > 0:
+            store = store or cache_util.open_names_map_store('studentmap.db')
+            store.upsert_many((kattis_username, name, canvas) for kattis_username, (name, canvas) in decided.items())
+            cached.update(decided)
+            print(f"Applied {len(decided)} reviewed matches from {review.path}.")
+
+        unmatched: List[Student] = []
+        for kattis_username, student in students.items():
+            entry = cached.get(kattis_username)
+            if entry is None:
+                unmatched.append(student)
+                continue
+            kattis_name, canvas_name = entry
+            if kattis_name != student.name or (len(canvas_name) > 0 and canvas_name not in self.student_rows):
+                # the student changed name in kattis or canvas, so only this entry is stale
+                log.info(f"Cached match {kattis_name}={canvas_name} for {kattis_username} is stale; rematching.")
+                store = store or cache_util.open_names_map_store('studentmap.db')
+                store.invalidate(kattis_username)
+                del cached[kattis_username]
+                unmatched.append(student)
+                continue
+            student.canvas_name = canvas_name
+            if len(canvas_name) > 0:
+                log.info(f"Matched {student.name} to {canvas_name} from cache.")
 
+        new_entries: Dict[str, Tuple[str, str]] = {}
+        self.review_candidates = []
+        for student in unmatched:
+            queued = len(self.review_candidates)
+            student.canvas_name = self._kattis_name_to_canvas_name(student)
+            if len(self.review_candidates) > queued:
+                # left unmatched until its review is decided
+                continue
+            # students without a match are saved too, so they aren't asked about on every run
+            new_entries[student.kattis_username] = (student.name, student.canvas_name)
+        if len(new_entries) > 0:
+            store = store or cache_util.open_names_map_store('studentmap.db')
+            if cache_util.update_names_map_store(store, new_entries, confirm=self.interactive):
+                cached.update(new_entries)
+        if store is not None:
+            store.close()
+        # reviews that were applied are done with, and the rest of this run's students were queued again if needed;
+        # the file is left alone if that is what it already holds
+        reviewed = set(students) | set(decided)
+        if self._review_written is None or len(decided) > 0 or \
+                (file_signature(review.path), self.review_candidates, reviewed) != self._review_written:
+            review.write(self.review_candidates, reviewed)
+            self._review_written = (file_signature(review.path), self.review_candidates, reviewed)
+
+        PROFILER.count('students_matched', sum(1 for student in students.values() if len(student.canvas_name) > 0))
+        for _, student in students.items():
+            if len(student.canvas_name) == 0:
+                log.warning(
+                    f"No canvas name found for {student.name} with kattis username {student.kattis_username}")
+
+    @profiled
     def populate_canvas_session_names(self, sessions: List[Session]):
+        # parse every column header once: (PS or Lab, number, Solve or Upsolve) -> column
+        key_columns: Dict[Tuple[str, str, str], str] = {}
+        unmapped_columns: Set[str] = set()
+        for canvas_col in self.canvas_df.columns:
+            if canvas_col not in self.canvas_pset_names:
+                continue
+            key = column_key(canvas_col)
+            if key is None:
+                unmapped_columns.add(canvas_col)
+            elif key in key_columns:
+                log.warning(f"Columns {key_columns[key]} and {canvas_col} are for the same session; using the first.")
+            else:
+                key_columns[key] = canvas_col
 
+        self.column_sessions = defaultdict(list)
+        unmapped_sessions: List[str] = []
         for session in sessions:
-            is_pset = len(re.findall('problem set', session.name.lower())) > 0
-            num = re.findall('\\d{2}', session.name.split('-')[1])[0]
-
-            canvas_type = 'PS' if is_pset else 'Lab'
-            solve_type = 'Upsolve' if session.is_upsolve else 'Solve'
-            canvas_prefix = f'{canvas_type}{num} {solve_type}'
+            canvas_col = key_columns.get(session_column_key(session))
+            if canvas_col is None:
+                unmapped_sessions.append(session.name)
+                continue
+            session.canvas_name = canvas_col
+            self.column_sessions[canvas_col].append(session)
+            PROFILER.count('sessions_mapped')
+            log.info(f"Matched Kattis Session {session.name} to {canvas_col}")
 
-            for canvas_col in self.canvas_pset_names:
-                if canvas_prefix in canvas_col:
-                    session.canvas_name = canvas_col
-                    log.info(f"Matched Kattis Session {session.name} to {canvas_col}")
-                    break
+        unmapped_columns.update(col for col in key_columns.values() if col not in self.column_sessions)
+        if len(unmapped_sessions) > 0 or len(unmapped_columns) > 0:
+            log.warning(f"{len(unmapped_sessions)} Kattis sessions have no Canvas column: {unmapped_sessions}")
+            log.warning(f"{len(unmapped_columns)} Canvas columns have no Kattis session: {sorted(unmapped_columns)}")
 
-    def populate_grades(self, student_dict: Dict[str, Student], sessions: List[Session]):
+    @profiled
+    def populate_grades(self, student_dict: Dict[str, Student], sessions: List[Session],
+                        columns: Optional[Set[str]] = None):
+        """
+        Computes every student's score for each problem set column and writes it into canvas_df.
+        :param columns: only grade these columns (all of canvas_pset_names by default)
+        """
         print("Computing scores...", end=' ')
-        # finally, for each session, compute the score for a given student and update the dataframe
-        for col in self.canvas_pset_names:
+        # only students that were found in canvas get a grade
+        students: List[Student] = [student for student in student_dict.values() if student.canvas_index != -1]
+        columns = self.canvas_pset_names if columns is None else self.canvas_pset_names & columns
+        if isinstance(self.canvas_df, CsvGradebook):
+            self._populate_grades_lightweight(students, columns)
+        else:
+            self._populate_grades_vectorized(students, sessions, columns)
+        print("Done!")
+
+    def _graded_columns(self, columns: Set[str]):
+        """:return: (column, is upsolve, associated sessions) for every column that should be graded"""
+        lightweight = isinstance(self.canvas_df, CsvGradebook)
+        for col in columns:
+            entered = self.canvas_df.count(col) if lightweight else self.canvas_df[col].count()
+            if entered > 1:
+                continue
             is_upsolve: bool = 'upsolve' in col.lower()
             # there might be multiple kattis sessions (like redos, extensions) that count in a given column..
-            associated_kattis_sessions: Set[Session] = set(
-                filter(
-                    lambda sess: sess.canvas_name == col,
-                    sessions
-                )
-            )
-            if self.canvas_df[col].count() > 1:
-                continue
+            associated_kattis_sessions: List[Session] = self.column_sessions.get(col, [])
             if len(associated_kattis_sessions) > 1:
                 log.debug("Found multiple sessions for " + col)
                 log.debug([s.name for s in associated_kattis_sessions])
-            # for each student, set their score for this column.
-            for _, student in student_dict.items():
-                if student.canvas_index == -1:
-                    continue
-                session_solved = set()
-                for session in associated_kattis_sessions:
-                    for problem in session.problems:
-                        if (is_upsolve and student.problems_solved[problem] == 0.5) or \
-                                (not is_upsolve and student.problems_solved[problem] == 1):
-                            session_solved.add(problem)
-                if len(session_solved) > 0:
-                    self.canvas_df.at[student.canvas_index, col] = len(session_solved)
-
-        # self.canvas_df[self.canvas_df.select_dtypes(include=['number']).columns] = self.canvas_df[self.canvas_df.select_dtypes(include=['number']).columns].fillna(0)
-        print("Done!")
+            yield col, is_upsolve, associated_kattis_sessions
+
+    def _populate_grades_vectorized(self, students: List[Student], sessions: List[Session], columns: Set[str]):
+        from util.Grading import GradeEngine
+
+        engine = GradeEngine(students, sessions)
+        student_rows = self.canvas_df.index.get_indexer([student.canvas_index for student in students])
+
+        # finally, for each column, compute the scores for all students and update the dataframe
+        for col, is_upsolve, associated_kattis_sessions in self._graded_columns(columns):
+            counts = engine.column_counts(associated_kattis_sessions, is_upsolve)
+            # only overwrite the cells of students that solved something in this column
+            solved = counts > 0
+            PROFILER.count('cells_written', solved.sum())
+            column_values = self.canvas_df[col].to_numpy(copy=True)
+            column_values[student_rows[solved]] = counts[solved]
+            self.canvas_df[col] = column_values
+
+    def _populate_grades_lightweight(self, students: List[Student], columns: Set[str]):
+        solve_rows = [student.problems_solved.row for student in students]
+        for col, is_upsolve, associated_kattis_sessions in self._graded_columns(columns):
+            counts = column_counts(solve_rows, associated_kattis_sessions, is_upsolve)
+            # only overwrite the cells of students that solved something in this column
+            solved = [(student.canvas_index, count) for student, count in zip(students, counts) if count > 0]
+            PROFILER.count('cells_written', len(solved))
+            self.canvas_df.set_cells(col, (row for row, _ in solved), (count for _, count in solved))
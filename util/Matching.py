@@ -0,0 +1,95 @@
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class CanvasName:
+    __slots__ = ('name', 'first', 'last', 'full')
+
+    def __init__(self, name: str, first: str, last: str):
+        self.name = name
+        self.first = first
+        self.last = last
+        # canvas names are 'Last, First'; kattis names are 'First Last'
+        self.full = f"{first} {last}"
+
+
+class NameMatcher:
+    """
+    Matches Kattis names against the Canvas roster.
+
+    Every Canvas name is normalized once and indexed by its first-name and last-name tokens, so resolving a
+    Kattis name only has to look at the Canvas entries that share a token with it.
+    """
+
+    def __init__(self, canvas_names: Iterable[str]):
+        self.entries: List[CanvasName] = []
+        self.first_tokens: Dict[str, List[int]] = defaultdict(list)
+        self.last_tokens: Dict[str, List[int]] = defaultdict(list)
+
+        for name in canvas_names:
+            if not isinstance(name, str) or ', ' not in name:
+                continue
+            last, _, first = name.strip().lower().partition(', ')
+            entry = CanvasName(name, first.strip(), last.strip())
+            position = len(self.entries)
+            self.entries.append(entry)
+            for token in entry.first.split():
+                self.first_tokens[token].append(position)
+            for token in entry.last.split():
+                self.last_tokens[token].append(position)
+
+    @staticmethod
+    def normalize_kattis_name(kattis_name: str) -> str:
+        """Lowercases a kattis name and reduces it to 'first last', preferring a parenthesized nickname."""
+        kattis_name = kattis_name.lower().strip()
+        if '(' in kattis_name:
+            kattis_name = kattis_name.split("(")[1].split(')')[0] + " " + kattis_name.split(" ")[-1]
+        if len(kattis_name.split(" ")) > 2:
+            kattis_name = kattis_name.split()[0] + " " + kattis_name.split()[-1]
+        return kattis_name
+
+    def _candidates(self, kattis_name: str, index: Dict[str, List[int]]) -> Set[int]:
+        candidates: Set[int] = set()
+        for token in kattis_name.split():
+            candidates.update(index.get(token, ()))
+        return candidates
+
+    def _ranked(self, kattis_name: str, positions: Iterable[int]) -> List[Tuple[str, float]]:
+        scored = [
+            (SequenceMatcher(None, kattis_name, self.entries[position].full).ratio(), position)
+            for position in positions
+        ]
+        # best score first, canvas order breaks ties
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(self.entries[position].name, score) for score, position in scored]
+
+    def direct_match(self, kattis_name: str) -> Optional[str]:
+        """Returns the first canvas name (in roster order) whose 'first last' form contains the kattis name."""
+        candidates = self._candidates(kattis_name, self.first_tokens) | self._candidates(kattis_name, self.last_tokens)
+        for position in sorted(candidates):
+            if kattis_name in self.entries[position].full:
+                return self.entries[position].name
+        return None
+
+    def last_name_matches(self, kattis_name: str, max_matches: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Canvas names whose last name appears in the kattis name, ranked by similarity.
+        :param max_matches: if more canvas names match than this, none are returned (and none are scored)
+        """
+        candidates = self._candidates(kattis_name, self.last_tokens)
+        matches = [p for p in candidates if self.entries[p].last in kattis_name]
+        if max_matches is not None and len(matches) > max_matches:
+            return []
+        return self._ranked(kattis_name, matches)
+
+    def first_name_matches(self, kattis_name: str, max_matches: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Canvas names whose first name appears in the kattis name, ranked by similarity.
+        :param max_matches: if more canvas names match than this, none are returned (and none are scored)
+        """
+        candidates = self._candidates(kattis_name, self.first_tokens)
+        matches = [p for p in candidates if self.entries[p].first in kattis_name]
+        if max_matches is not None and len(matches) > max_matches:
+            return []
+        return self._ranked(kattis_name, matches)
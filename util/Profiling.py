@@ -0,0 +1,117 @@
+import cProfile
+import functools
+import json
+import time
+import tracemalloc
+from typing import Dict, Optional
+
+
+class Profiler:
+    """
+    Records wall time for each stage of a run, and, once enabled, CPU time and peak memory (tracemalloc) for each
+    stage, timings for the functions decorated with @profiled, and counters of the work done.
+    Stages run one after another: starting a stage ends the previous one.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.cprofile_stage: Optional[str] = None
+        self.cprofile: Optional[cProfile.Profile] = None
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.functions: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+        self._stage: Optional[str] = None
+        self._stage_start = (0.0, 0.0, 0)
+
+    def reset(self, enabled: bool = False, cprofile_stage: Optional[str] = None):
+        """
+        Clears everything recorded so far.
+        :param enabled: record CPU time, memory, function timings and counters as well as stage wall times
+        :param cprofile_stage: also run cProfile during the stage with this name
+        """
+        self.end_stage()
+        self.enabled = enabled
+        self.cprofile_stage = cprofile_stage
+        self.cprofile = None
+        self.stages.clear()
+        self.functions.clear()
+        self.counters.clear()
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def start_stage(self, name: str):
+        self.end_stage()
+        self._stage = name
+        memory = 0
+        if self.enabled:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            memory = tracemalloc.get_traced_memory()[0]
+        if name == self.cprofile_stage:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        self._stage_start = (time.perf_counter(), time.process_time(), memory)
+
+    def end_stage(self):
+        if self._stage is None:
+            return
+        wall_start, cpu_start, memory_start = self._stage_start
+        stage = {'wall': time.perf_counter() - wall_start}
+        if self.enabled:
+            memory, peak_memory = tracemalloc.get_traced_memory()
+            stage['cpu'] = time.process_time() - cpu_start
+            stage['peak_memory'] = peak_memory
+            stage['memory_delta'] = memory - memory_start
+        if self._stage == self.cprofile_stage and self.cprofile is not None:
+            self.cprofile.disable()
+        self.stages[self._stage] = stage
+        self._stage = None
+
+    def count(self, name: str, amount: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + int(amount)
+
+    def record_call(self, name: str, wall: float, cpu: float):
+        function = self.functions.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+        function['calls'] += 1
+        function['wall'] += wall
+        function['cpu'] += cpu
+
+    def timings(self) -> Dict[str, float]:
+        return {name: stage['wall'] for name, stage in self.stages.items()}
+
+    def report(self) -> Dict:
+        return {'stages': self.stages, 'functions': self.functions, 'counters': self.counters}
+
+    def write_report(self, filepath: str):
+        with open(filepath, "w+") as report_file:
+            json.dump(self.report(), report_file, indent=1)
+        print(f"Saved profile report to {filepath}")
+
+    def dump_cprofile(self, filepath: str):
+        if self.cprofile is None:
+            return
+        self.cprofile.dump_stats(filepath)
+        print(f"Saved cProfile stats for the {self.cprofile_stage} stage to {filepath}")
+
+
+PROFILER = Profiler()
+
+
+def profiled(func):
+    """Records the calls and time spent in a function while the profiler is enabled; free otherwise."""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not PROFILER.enabled:
+            return func(*args, **kwargs)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            PROFILER.record_call(name, time.perf_counter() - wall_start, time.process_time() - cpu_start)
+
+    return wrapper
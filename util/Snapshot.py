@@ -0,0 +1,233 @@
+"""
+Columnar snapshot of a parsed Kattis dump, saved as .npy arrays in a folder of the cache.
+
+Every string (usernames, names, emails, session and problem names, ...) is stored once in a utf-8 pool and referred to
+by its index. Variable length lists (a session's problems and results, a result's members and solved problems) are
+flattened into one array with an offsets array next to it: the items of row i are items[offsets[i]:offsets[i + 1]].
+Each student's scores are saved as SolveTable.to_bytes, concatenated with offsets like the strings.
+The arrays are memory-mapped when the snapshot is opened, so analytics can use them directly without reading the
+whole dump, and load_models rebuilds the Student and Session objects without parsing any JSON or recomputing scores.
+
+numpy is only imported when a snapshot is written or opened.
+"""
+import json
+import logging as log
+import os
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models.Problems import PROBLEMS
+from models.Result import USERNAMES, ResultTable
+from models.Session import Session
+from models.Student import Student
+from util.Profiling import profiled
+from util.Watch import file_signature
+
+SNAPSHOT_VERSION = 2
+ARRAYS = [
+    'strings', 'string_offsets',
+    'student_username', 'student_name', 'student_non_anonymous', 'student_email',
+    'student_solves', 'student_solve_offsets',
+    'problem_name',
+    'session_name', 'session_starttime', 'session_length', 'session_problem_offsets', 'session_problems',
+    'session_result_offsets',
+    'result_team_name', 'result_solved_count', 'result_total_time', 'result_member_offsets', 'result_members',
+    'result_problem_offsets', 'result_problems', 'result_solve_times'
+]
+
+
+def _array(typecode: str, values) -> array:
+    """Copies a numpy array into an array.array of the typecode, without going through a Python int per item."""
+    import numpy
+
+    result = array(typecode)
+    result.frombytes(numpy.ascontiguousarray(values, dtype=numpy.dtype(f"=u{result.itemsize}")).tobytes())
+    return result
+
+
+class _StringPool:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def id(self, string) -> int:
+        string = str(string)
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[string] = string_id
+            self.strings.append(string)
+        return string_id
+
+
+@profiled
+def write_snapshot(folder: str, students: Iterable[Student], sessions: List[Session], source: str = ''):
+    """
+    :param source: the Kattis dump the students and sessions were parsed from, recorded so a stale snapshot is
+        noticed when the dump changes
+    """
+    import numpy
+
+    pool = _StringPool()
+    students = list(students)
+    columns: Dict[str, List[int]] = {name: [] for name in ARRAYS}
+    for student in students:
+        columns['student_username'].append(pool.id(student.kattis_username))
+        columns['student_name'].append(pool.id(student.name))
+        columns['student_non_anonymous'].append(pool.id('f' if not student.hidden else 't'))
+        columns['student_email'].append(pool.id(student.email))
+    columns['problem_name'] = [pool.id(PROBLEMS.name(problem_id)) for problem_id in range(len(PROBLEMS))]
+
+    columns['session_problem_offsets'].append(0)
+    columns['session_result_offsets'].append(0)
+    columns['result_member_offsets'].append(0)
+    columns['result_problem_offsets'].append(0)
+    for session in sessions:
+        columns['session_name'].append(pool.id(session.name))
+        columns['session_starttime'].append(pool.id(session.starttime))
+        columns['session_length'].append(pool.id(session.length))
+        columns['session_problems'].extend(PROBLEMS.intern(problem) for problem in session.problems)
+        columns['session_problem_offsets'].append(len(columns['session_problems']))
+        for result in session.results:
+            columns['result_team_name'].append(pool.id(result.team_name))
+            columns['result_solved_count'].append(result.solved_count)
+            columns['result_total_time'].append(result.total_time)
+            columns['result_members'].extend(pool.id(member) for member in result.members)
+            columns['result_member_offsets'].append(len(columns['result_members']))
+            columns['result_problems'].extend(result.problem_ids)
+            columns['result_solve_times'].extend(result.solve_times)
+            columns['result_problem_offsets'].append(len(columns['result_problems']))
+        columns['session_result_offsets'].append(len(columns['result_team_name']))
+
+    encoded = [string.encode() for string in pool.strings]
+    arrays = {name: numpy.asarray(values, dtype=numpy.int64) for name, values in columns.items()}
+    arrays['strings'] = numpy.frombuffer(b''.join(encoded), dtype=numpy.uint8)
+    arrays['string_offsets'] = numpy.cumsum([0] + [len(string) for string in encoded], dtype=numpy.int64)
+    solves = [student.problems_solved.to_bytes() for student in students]
+    arrays['student_solves'] = numpy.frombuffer(b''.join(solves), dtype=numpy.uint8)
+    arrays['student_solve_offsets'] = numpy.cumsum([0] + [len(row) for row in solves], dtype=numpy.int64)
+    # ids and counts fit in 32 bits, which halves the snapshot
+    for name in ARRAYS:
+        if name not in ('strings', 'string_offsets', 'student_solves', 'student_solve_offsets', 'result_total_time',
+                        'result_solve_times'):
+            arrays[name] = arrays[name].astype(numpy.int32)
+
+    os.makedirs(folder, exist_ok=True)
+    for name, values in arrays.items():
+        numpy.save(os.path.join(folder, f"{name}.npy"), values)
+    with open(os.path.join(folder, 'snapshot.json'), "w") as meta_file:
+        json.dump({
+            'version': SNAPSHOT_VERSION,
+            'source': file_signature(source) if len(source) > 0 else None,
+            'students': len(students),
+            'sessions': len(sessions),
+            'results': len(columns['result_team_name']),
+            'problems': len(PROBLEMS)
+        }, meta_file, indent=1)
+    print(f"Saved a snapshot of {len(students)} students and {len(sessions)} sessions to {folder}")
+
+
+class KattisSnapshot:
+    """A snapshot written by write_snapshot, with every array memory-mapped as an attribute named after it."""
+
+    def __init__(self, folder: str):
+        import numpy
+
+        self.folder = folder
+        with open(os.path.join(folder, 'snapshot.json'), "r") as meta_file:
+            self.meta = json.load(meta_file)
+        for name in ARRAYS:
+            setattr(self, name, numpy.load(os.path.join(folder, f"{name}.npy"), mmap_mode='r'))
+
+    @classmethod
+    def open(cls, folder: str, source: str = '') -> Optional['KattisSnapshot']:
+        """:return: the snapshot in the folder, or None if there isn't one or it wasn't made from the source dump"""
+        try:
+            snapshot = cls(folder)
+        except (OSError, ValueError) as e:
+            log.info(f"No usable Kattis snapshot in {folder}: {e}")
+            return None
+        if snapshot.meta.get('version') != SNAPSHOT_VERSION:
+            log.info(f"The Kattis snapshot in {folder} has an old format.")
+            return None
+        if len(source) > 0 and snapshot.meta.get('source') != list(file_signature(source) or []):
+            log.info(f"The Kattis snapshot in {folder} wasn't made from the current {source}.")
+            return None
+        return snapshot
+
+    def string(self, string_id: int) -> str:
+        start, end = self.string_offsets[string_id], self.string_offsets[string_id + 1]
+        return self.strings[start:end].tobytes().decode()
+
+    def strings_list(self) -> List[str]:
+        data = self.strings.tobytes()
+        offsets = self.string_offsets.tolist()
+        return [data[offsets[i]:offsets[i + 1]].decode() for i in range(len(offsets) - 1)]
+
+    @profiled
+    def load_models(self) -> Tuple[Dict[str, Student], List[Session]]:
+        """
+        Rebuilds the students, with the scores they had when the snapshot was saved, and the sessions, the same as
+        parsing the dump they were saved from.
+        """
+        import numpy
+
+        strings = self.strings_list()
+        problem_names = [strings[string_id] for string_id in self.problem_name.tolist()]
+        # the snapshot's problem ids in this run, usually the same ones
+        problem_ids = [PROBLEMS.intern(problem_name) for problem_name in problem_names]
+        remap = problem_ids if problem_ids != list(range(len(problem_ids))) else None
+
+        students: Dict[str, Student] = {}
+        solves = self.student_solves.tobytes()
+        solve_offsets = self.student_solve_offsets.tolist()
+        for i, (username, name, non_anonymous, email) in enumerate(zip(self.student_username.tolist(),
+                                                                       self.student_name.tolist(),
+                                                                       self.student_non_anonymous.tolist(),
+                                                                       self.student_email.tolist())):
+            student = Student(strings[username], strings[name], strings[non_anonymous], strings[email])
+            student.problems_solved.load_bytes(solves[solve_offsets[i]:solve_offsets[i + 1]], remap)
+            students[student.kattis_username] = student
+
+        # map the pool's string ids to USERNAMES ids and the snapshot's problem ids to PROBLEMS ids once, for every
+        # result at a time, instead of interning each name of each result
+        used = numpy.unique(numpy.concatenate([self.result_team_name, self.result_members]))
+        username_ids = numpy.zeros(len(strings), dtype=numpy.int64)
+        username_ids[used] = [USERNAMES.intern(strings[string_id]) for string_id in used.tolist()]
+        team_names = username_ids[self.result_team_name]
+        members = username_ids[self.result_members]
+        result_problems = numpy.asarray(problem_ids, dtype=numpy.int64)[self.result_problems]
+
+        session_problem_offsets = self.session_problem_offsets.tolist()
+        session_problems = self.session_problems.tolist()
+        session_result_offsets = self.session_result_offsets.tolist()
+        member_offsets = self.result_member_offsets
+        problem_offsets = self.result_problem_offsets
+
+        sessions: List[Session] = []
+        for i, (name, starttime, length) in enumerate(zip(self.session_name.tolist(),
+                                                          self.session_starttime.tolist(),
+                                                          self.session_length.tolist())):
+            session = Session.get_emtpy_model()
+            session.name = strings[name]
+            session.starttime = strings[starttime]
+            session.length = strings[length]
+            for problem_id in session_problems[session_problem_offsets[i]:session_problem_offsets[i + 1]]:
+                session.problems.add(PROBLEMS.name(problem_ids[problem_id]))
+            # the session's results are a slice of every result column
+            start, end = session_result_offsets[i], session_result_offsets[i + 1]
+            member_start, member_end = int(member_offsets[start]), int(member_offsets[end])
+            problem_start, problem_end = int(problem_offsets[start]), int(problem_offsets[end])
+            session.results = ResultTable.from_columns(
+                _array('I', team_names[start:end]),
+                _array('H', self.result_solved_count[start:end]),
+                _array('I', self.result_total_time[start:end]),
+                _array('I', member_offsets[start:end + 1] - member_start),
+                _array('I', members[member_start:member_end]),
+                _array('I', problem_offsets[start:end + 1] - problem_start),
+                _array('I', result_problems[problem_start:problem_end]),
+                _array('I', self.result_solve_times[problem_start:problem_end])
+            )
+            session.is_upsolve = Session._is_upsolve_session(session.name)
+            sessions.append(session)
+        return students, sessions
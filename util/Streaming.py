@@ -0,0 +1,91 @@
+import json
+from typing import Any, Iterator, Set, TextIO, Tuple
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _JsonReader:
+    """Buffered reader that decodes one JSON value at a time from a text file."""
+
+    def __init__(self, file: TextIO, chunk_size: int):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        # read at least as much as is already pending, so a large value isn't re-decoded once per chunk
+        chunk = self.file.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character without consuming it, or '' at the end of the file."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found}' while streaming JSON.")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a value that runs to the end of the buffer (e.g. a number) might continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def iter_object_arrays(file: TextIO, keys: Set[str], chunk_size: int = 1 << 16) -> Iterator[Tuple[str, Any]]:
+    """
+    Streams the elements of the top-level arrays stored under the given keys of a JSON object.
+    Only one element is decoded and held in memory at a time; other top-level values are skipped.
+    :param file: text file containing a single JSON object
+    :param keys: top-level keys whose array elements should be yielded
+    :param chunk_size: number of characters to read from the file at a time
+    :return: (key, element) pairs in file order
+    """
+    reader = _JsonReader(file, chunk_size)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key in keys and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() != ']':
+                while True:
+                    yield key, reader.value()
+                    if reader.peek() != ',':
+                        break
+                    reader.expect(',')
+            reader.expect(']')
+        else:
+            reader.value()
+        if reader.peek() != ',':
+            break
+        reader.expect(',')
+    reader.expect('}')
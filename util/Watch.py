@@ -0,0 +1,162 @@
+"""
+Pieces of the long-running watch mode: polling the input exports for changes, and a small local HTTP endpoint that
+serves the current grades and the last run's timings.
+"""
+import glob
+import json
+import logging as log
+import os
+import threading
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+
+def latest_export(path: str, extension: str) -> str:
+    """
+    :param path: an export file, or a folder new exports are dropped into
+    :return: the file itself, or the most recently modified file with the extension in the folder ('' if none)
+    """
+    if not os.path.isdir(path):
+        return path
+    exports = glob.glob(os.path.join(path, f"*{extension}"))
+    return max(exports, key=os.path.getmtime) if len(exports) > 0 else ''
+
+
+def file_signature(path: str) -> Optional[Tuple[str, int, int]]:
+    """(path, modification time, size), or None if the file doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+class InputWatcher:
+    """
+    Polls the input paths and reports which of them changed since they were last taken.
+    A change is only reported once the file looks the same on two polls in a row, so exports that are still being
+    written aren't read half way through.
+    """
+
+    def __init__(self, paths: Dict[str, Tuple[str, str]]):
+        """:param paths: input name -> (file or folder, export extension)"""
+        self.paths = paths
+        self.taken: Dict[str, Optional[Tuple[str, int, int]]] = {name: None for name in paths}
+        self._last_seen: Dict[str, Optional[Tuple[str, int, int]]] = {name: None for name in paths}
+
+    def current(self, name: str) -> str:
+        path, extension = self.paths[name]
+        return latest_export(path, extension)
+
+    def poll(self) -> Set[str]:
+        """:return: the names of the inputs that changed and have settled since they were last taken"""
+        changed: Set[str] = set()
+        for name in self.paths:
+            signature = file_signature(self.current(name))
+            if signature is not None and signature != self.taken[name] and signature == self._last_seen[name]:
+                changed.add(name)
+            self._last_seen[name] = signature
+        return changed
+
+    def take(self, names: Iterable[str]):
+        """Marks the version of the inputs seen by the last poll as processed."""
+        for name in names:
+            self.taken[name] = self._last_seen[name]
+
+    def take_current(self, names: Iterable[str]):
+        """Marks the version of the inputs on disk now as processed, e.g. after this process wrote them itself."""
+        for name in names:
+            signature = file_signature(self.current(name))
+            self.taken[name] = signature
+            self._last_seen[name] = signature
+
+
+def grade_table(canvas_df, columns: Iterable[str], rows: Dict[str, int]) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    :param rows: canvas name -> gradebook row of every graded student
+    :return: canvas name -> column -> score, for either gradebook backend
+    """
+    grades: Dict[str, Dict[str, Optional[float]]] = {name: {} for name in rows}
+    for col in sorted(columns):
+        cells = canvas_df[col]
+        cells = cells.tolist() if hasattr(cells, 'tolist') else cells
+        for name, row in rows.items():
+            grades[name][col] = _score(cells[row])
+    return grades
+
+
+def _score(cell) -> Optional[float]:
+    if isinstance(cell, str):
+        try:
+            cell = float(cell)
+        except ValueError:
+            return None
+    if cell is None or cell != cell:
+        # empty, or NaN
+        return None
+    return float(cell)
+
+
+class StatusServer:
+    """Serves the latest published grades (/grades) and run summary (/status) as JSON from a background thread."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8000):
+        # imported here, so runs that don't watch don't load the http server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self._lock = threading.Lock()
+        self._grades = b'{}'
+        self._status = b'{}'
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0].rstrip('/')
+                if path == '/grades':
+                    body = server.grades
+                elif path in ('', '/status'):
+                    body = server.status
+                else:
+                    self.send_error(404, "Try /grades or /status")
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                log.info(f"{self.address_string()} {format % args}")
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def grades(self) -> bytes:
+        with self._lock:
+            return self._grades
+
+    @property
+    def status(self) -> bytes:
+        with self._lock:
+            return self._status
+
+    def publish(self, grades: Dict[str, Dict[str, Optional[float]]], status: Dict):
+        # encoded once here so requests never see a half updated run
+        grades_body = json.dumps(grades).encode()
+        status_body = json.dumps(status).encode()
+        with self._lock:
+            self._grades = grades_body
+            self._status = status_body
+
+    def start(self):
+        self.thread.start()
+        print(f"Serving grades at {self.address}/grades and the last run at {self.address}/status")
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()